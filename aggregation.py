@@ -0,0 +1,149 @@
+import calendar
+
+import numpy as np
+import pandas as pd
+
+from dates import calendar_fields
+
+
+CUBE_KEYS = ['year', 'quarter', 'month', 'day', 'weekday', 'is_TV_show']
+
+
+def build_cube(netflix_hist, keys=()):
+    """
+    Aggregate the viewing history in a single pass: watched minutes and number
+    of titles by (year, quarter, month, day, weekday, is_TV_show).
+    Every period plot is a slice of this cube.
+    :param keys: extra columns of the history to aggregate by, e.g. ('profile',)
+    :return: DataFrame with keys, CUBE_KEYS, "duration" and "count" columns
+    """
+    keys = list(keys)
+    daily = pd.DataFrame(dict({key: netflix_hist[key].values for key in keys},
+                              day_number=np.asarray(netflix_hist['day_number']),
+                              is_TV_show=np.asarray(netflix_hist['is_TV_show'], dtype=bool),
+                              duration=np.asarray(netflix_hist['duration'])))
+    daily = daily.groupby(keys + ['day_number', 'is_TV_show'], observed=True)['duration'].agg(['sum', 'count'])
+    daily = daily.rename(columns={'sum': 'duration'}).reset_index()
+
+    # Calendar fields are derived from the (few) distinct days, not every row
+    cube = pd.DataFrame(calendar_fields(daily['day_number'].values))
+    for key in keys:
+        cube[key] = daily[key].values
+    cube['is_TV_show'] = daily['is_TV_show'].values
+    cube['duration'] = daily['duration'].values
+    cube['count'] = daily['count'].values
+
+    return cube[keys + CUBE_KEYS + ['duration', 'count']]
+
+
+def merge_cubes(cubes):
+    cubes = [cube for cube in cubes if len(cube) > 0]
+    if not cubes:
+        return pd.DataFrame(columns=CUBE_KEYS + ['duration', 'count'])
+
+    cube = pd.concat(cubes, ignore_index=True)
+    return cube.groupby(CUBE_KEYS, as_index=False)[['duration', 'count']].sum()
+
+
+def slice_cube(cube, by, **filters):
+    """
+    Sum duration and count of the cube over every key not in "by", keeping
+    only the rows that match the given filters (e.g. year=2020, month=5).
+    :return: DataFrame with the "by" keys, "duration", "count" and "duration_hours"
+    """
+    for key, value in filters.items():
+        cube = cube[cube[key] == value]
+
+    sliced = cube.groupby(by, as_index=False)[['duration', 'count']].sum()
+    sliced['duration_hours'] = sliced['duration'] / 60
+
+    return sliced
+
+
+def fill_calendar(aggregate, keys, levels):
+    """
+    Reindex an aggregate onto the dense grid given by the product of levels
+    (one per key), filling the missing periods with zeros.
+    :return: DataFrame sorted by keys with one row per point of the grid
+    """
+    if len(keys) == 1:
+        grid = pd.Index(levels[0], name=keys[0])
+    else:
+        grid = pd.MultiIndex.from_product(levels, names=keys)
+    filled = aggregate.set_index(keys).reindex(grid, fill_value=0)
+
+    return filled.reset_index()
+
+
+def calendar_years(first_day, last_day):
+    return range(first_day.year, last_day.year + 1)
+
+
+def fill_year_month(aggregate, first_day, last_day, keys=('year', 'month')):
+    return fill_calendar(aggregate, list(keys), [calendar_years(first_day, last_day), range(1, 13)])
+
+
+def fill_year_quarter(aggregate, first_day, last_day, keys=('year', 'quarter')):
+    return fill_calendar(aggregate, list(keys), [calendar_years(first_day, last_day), range(1, 5)])
+
+
+def fill_quarter_info (quarter_year_info, first_day, last_day):
+
+    quarter_names = {1:"Q1", 2:"Q2", 3:"Q3", 4:"Q4"}
+
+    quarter_year_info = fill_year_quarter(quarter_year_info, first_day, last_day, keys=('year','quarter_id'))
+
+    quarter_year_info["quarter"] = quarter_year_info["quarter_id"].replace(quarter_names)
+    quarter_year_info['quarter-year'] = ["{}-{}".format(m, y) for m, y in zip(quarter_year_info['quarter'], quarter_year_info['year'])]
+    quarter_year_info = quarter_year_info.set_index('quarter-year')
+
+    quarter_year_info = quarter_year_info.sort_values(['year','quarter_id'])
+
+    return quarter_year_info
+
+
+def fill_month_day(aggregate, year, month, key='day'):
+    n_days = calendar.monthrange(year, month)[1]
+    return fill_calendar(aggregate, [key], [range(1, n_days + 1)])
+
+
+def fill_weekday(aggregate, key='weekday'):
+    return fill_calendar(aggregate, [key], [range(7)])
+
+
+def total_duration(cube):
+    return cube['duration'].sum()
+
+
+def year_month(cube):
+    return slice_cube(cube, ['year', 'month'])
+
+
+def year_quarter(cube):
+    return slice_cube(cube, ['year', 'quarter'])
+
+
+def year_quarter_type(cube):
+    return slice_cube(cube, ['year', 'quarter', 'is_TV_show'])
+
+
+def years(cube):
+    return slice_cube(cube, ['year'])
+
+
+def weekday_type(cube):
+    return slice_cube(cube, ['weekday', 'is_TV_show'])
+
+
+def content_type(cube):
+    return slice_cube(cube, ['is_TV_show'])
+
+
+def month_days(cube, year, month):
+    return slice_cube(cube, ['day'], year=year, month=month)
+
+
+def busiest_month(cube):
+    months = year_month(cube)
+    busiest = months.loc[np.argmax(months['duration'].values)]
+    return int(busiest['month']), int(busiest['year'])
@@ -0,0 +1,269 @@
+"""
+Local HTTP/JSON API of the analysis, for other services to use without
+Streamlit.
+
+    python api.py [--host 127.0.0.1] [--port 8000] [--workers 4]
+
+POST /analyse with a viewing history CSV as the body returns the summary,
+the year evolution, the monthly, quarterly and weekday series and the top TV
+shows as JSON. The query string can set tv_show_duration, film_duration
+(minutes) and top (number of TV shows). GET /health reports the state of the
+server.
+
+The server is a single asyncio loop: requests are parsed on it and analysed
+in a pool of worker processes, which import neither Streamlit nor the
+plotting modules.
+Results are cached by the hash of the CSV and the parameters, identical
+requests in flight share one analysis, and requests beyond the pool and its
+queue are turned away with 503.
+"""
+import argparse
+import asyncio
+import calendar
+import json
+import math
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from urllib.parse import parse_qs, urlsplit
+
+from aggregation import fill_weekday, weekday_type
+from batch import FILM_DURATION, TV_SHOW_DURATION, summarise_cube
+from cache import ResultCache, content_key
+from durations import load_catalog
+from instrument import Recorder, configure_logging, logger
+from pipeline import TV_shows_ranking_plot, load_history, year_growth
+
+
+MAX_WORKERS = 4
+QUEUE_PER_WORKER = 4
+MAX_BODY_BYTES = 256 * 1024 ** 2
+MAX_TOP = 100
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 411: 'Length Required',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def analyse_content(content, TV_show_duration=TV_SHOW_DURATION, film_duration=FILM_DURATION, top_n=10):
+    """
+    Run the app's pipeline on the bytes of a CSV, keeping only its aggregates
+    in memory. Runs in a worker process.
+    :return: JSON serialisable analysis
+    """
+    _, cube, show_index, first_day, last_day = load_history(BytesIO(content), TV_show_duration, film_duration,
+                                                            keep_history=False)
+    analysis = summarise_cube(cube, show_index, first_day, last_day, top_n)
+
+    analysis['months'] = analysis['days'] / 30
+    growth = year_growth(cube)
+    analysis['year_evolution'] = [{'year': int(y), 'hours': float(h), 'growth': float(g)}
+                                  for y, h, g in zip(growth.index, growth['duration [hours]'], growth['growth [%]'])]
+
+    weekdays = weekday_type(cube)
+    by_type = {is_TV_show: fill_weekday(weekdays[weekdays['is_TV_show'] == is_TV_show][['weekday', 'duration_hours']])
+               for is_TV_show in (True, False)}
+    analysis['weekday'] = [{'weekday': calendar.day_abbr[int(d)], 'TV_show_hours': float(t), 'film_hours': float(f)}
+                           for d, t, f in zip(by_type[True]['weekday'], by_type[True]['duration_hours'],
+                                              by_type[False]['duration_hours'])]
+
+    most_watched = TV_shows_ranking_plot(None, show_index, top_n)
+    analysis['top_shows'] = [{'show': show, 'episodes': int(row['count']), 'hours': float(row['duration_hours'])}
+                             for show, row in most_watched.iterrows()]
+
+    return analysis
+
+
+def _number(query, name, default, kind=float, low=0, high=None):
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        value = kind(values[-1])
+    except ValueError:
+        raise HTTPError(400, "{} must be a number".format(name))
+    if not math.isfinite(value):
+        raise HTTPError(400, "{} must be a finite number".format(name))
+    if value <= low or (high is not None and value > high):
+        raise HTTPError(400, "{} is out of range".format(name))
+    return value
+
+
+class AnalysisServer(object):
+    """
+    Analyses uploaded histories in a bounded pool of worker processes, with
+    a cache of the JSON responses shared by every request
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, queue_size=None, cache=None, max_body_bytes=MAX_BODY_BYTES):
+        self.max_workers = max_workers
+        self.queue_size = max_workers * QUEUE_PER_WORKER if queue_size is None else queue_size
+        self.cache = ResultCache(max_entries=256, max_bytes=64 * 1024 ** 2) if cache is None else cache
+        self.max_body_bytes = max_body_bytes
+        self.pool = ProcessPoolExecutor(max_workers=max_workers)
+        self._in_flight = {}
+        self.served = 0
+
+    async def analyse(self, content, query):
+        """
+        JSON of the analysis of a CSV, from the cache, from an identical
+        request in flight or from a worker
+        :return: body, whether it came from the cache
+        """
+        TV_show_duration = _number(query, 'tv_show_duration', TV_SHOW_DURATION)
+        film_duration = _number(query, 'film_duration', FILM_DURATION)
+        top_n = _number(query, 'top', 10, kind=int, high=MAX_TOP)
+
+        # Hashing releases the GIL, so large uploads are hashed off the loop
+        key = await asyncio.get_running_loop().run_in_executor(None, content_key, content, TV_show_duration,
+                                                             film_duration, load_catalog().key, top_n)
+        body = self.cache.get(key)
+        if body is not None:
+            return body, True
+
+        task = self._in_flight.get(key)
+        if task is None:
+            if len(self._in_flight) >= self.max_workers + self.queue_size:
+                raise HTTPError(503, "Too many analyses in progress, retry later")
+            task = asyncio.ensure_future(self._run(key, content, TV_show_duration, film_duration, top_n))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # A client that goes away does not cancel the analysis other clients wait for
+        return await asyncio.shield(task), False
+
+    async def _run(self, key, content, TV_show_duration, film_duration, top_n):
+        loop = asyncio.get_running_loop()
+        try:
+            analysis = await loop.run_in_executor(self.pool, analyse_content, content, TV_show_duration,
+                                                  film_duration, top_n)
+        except ValueError as error:
+            raise HTTPError(400, str(error))
+        except KeyError as error:
+            raise HTTPError(400, "Missing column {} in the CSV".format(error))
+
+        return self.cache.put(key, json.dumps(analysis).encode('utf-8'))
+
+    def health(self):
+        return json.dumps({'status': 'ok', 'workers': self.max_workers, 'in_flight': len(self._in_flight),
+                           'cached': len(self.cache), 'served': self.served}).encode('utf-8')
+
+    async def read_request(self, reader):
+        """
+        :return: method, path, query, body
+        """
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3:
+            raise HTTPError(400, "Malformed request line")
+        method, target, _ = request_line
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        body = b''
+        if method == 'POST':
+            if 'content-length' not in headers:
+                raise HTTPError(411, "Content-Length is required")
+            try:
+                length = int(headers['content-length'])
+            except ValueError:
+                length = -1
+            if length < 0:
+                raise HTTPError(400, "Malformed Content-Length")
+            if length > self.max_body_bytes:
+                raise HTTPError(413, "The file is larger than {} MB".format(self.max_body_bytes // 1024 ** 2))
+            body = await reader.readexactly(length)
+
+        url = urlsplit(target)
+        return method, url.path, parse_qs(url.query), body
+
+    async def respond(self, method, path, query, body):
+        """
+        :return: status, JSON body, extra headers
+        """
+        if path == '/health':
+            if method != 'GET':
+                raise HTTPError(405, "Use GET")
+            return 200, self.health(), {}
+        if path == '/analyse':
+            if method != 'POST':
+                raise HTTPError(405, "POST a viewing history CSV")
+            analysis, cached = await self.analyse(body, query)
+            return 200, analysis, {'X-Cache': 'hit' if cached else 'miss'}
+        raise HTTPError(404, "Unknown path {}".format(path))
+
+    async def handle(self, reader, writer):
+        recorder = Recorder(run_id='api')
+        start = time.perf_counter()
+        method, path, headers = None, None, {}
+        try:
+            method, path, query, body = await self.read_request(reader)
+            status, payload, headers = await self.respond(method, path, query, body)
+        except HTTPError as error:
+            status, payload = error.status, json.dumps({'error': str(error)}).encode('utf-8')
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception:
+            logger.exception('analysis failed')
+            status, payload = 500, json.dumps({'error': "The analysis failed"}).encode('utf-8')
+
+        head = ['HTTP/1.1 {} {}'.format(status, REASONS[status]), 'Content-Type: application/json',
+                'Content-Length: {}'.format(len(payload)), 'Connection: close']
+        head += ['{}: {}'.format(name, value) for name, value in headers.items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+        self.served += 1
+        recorder.add('{} {} {}'.format(method, path, status), time.perf_counter() - start)
+        recorder.emit()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info(json.dumps({'listening': '{}:{}'.format(host, port), 'workers': self.max_workers}))
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Netflix viewing history analysis as a JSON API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('-w', '--workers', type=int, default=MAX_WORKERS, help="worker processes")
+    parser.add_argument('--queue', type=int, default=None,
+                        help="analyses waiting for a worker before new ones are refused (default: {} per worker)".format(QUEUE_PER_WORKER))
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    server = AnalysisServer(args.workers, args.queue)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Analyse many Netflix viewing history exports without Streamlit.
+
+    python batch.py "exports/**/*.csv" --output summaries --format json --workers 8
+
+Every file goes through the same pipeline as the app (clean_and_prepare_data,
+add_duration and the aggregation cube) and gets a summary with its watched
+hours, top TV shows and monthly/quarterly series. With --cache cache the
+prepared histories are shared with the app's columnar cache.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from aggregation import fill_year_month, fill_year_quarter, total_duration, year_month, year_quarter, years
+from cache import file_key
+from columnar import CACHE_DIR
+from durations import load_catalog
+from pipeline import load_history, prepare_history
+from shows import top_shows
+
+
+TV_SHOW_DURATION = 40
+FILM_DURATION = 100
+
+
+def find_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, '**', '*.csv'), recursive=True))
+        else:
+            files.extend(glob.glob(path, recursive=True))
+    return sorted(set(files))
+
+
+def user_ids(files):
+    """
+    Name every file by its path relative to the common directory, as exports
+    are usually all called NetflixViewingHistory.csv
+    """
+    if len(files) == 1:
+        return [os.path.splitext(os.path.basename(files[0]))[0]]
+
+    root = os.path.commonpath([os.path.abspath(f) for f in files])
+    return [os.path.splitext(os.path.relpath(os.path.abspath(f), root))[0].replace(os.sep, '__') for f in files]
+
+
+def summarise_file(path, TV_show_duration=TV_SHOW_DURATION, film_duration=FILM_DURATION, top_n=10, cache_dir=None):
+    """
+    Run the pipeline on one file, keeping only its aggregates in memory. With
+    a cache_dir the prepared history goes through the columnar cache shared
+    with the app, so a file already seen is memory-mapped instead of parsed.
+    :return: JSON serialisable summary
+    """
+    if cache_dir is None:
+        _, cube, show_index, first_day, last_day = load_history(path, TV_show_duration, film_duration, keep_history=False)
+    else:
+        # Same key as the app gives to an upload of the file
+        key = file_key(path, TV_show_duration, film_duration, load_catalog().key)
+        _, cube, show_index, first_day, last_day = prepare_history(path, key, TV_show_duration, film_duration,
+                                                                   cache_dir=cache_dir)
+
+    return summarise_cube(cube, show_index, first_day, last_day, top_n)
+
+
+def summarise_cube(cube, show_index, first_day, last_day, top_n=10):
+    """
+    Watched hours, top TV shows and yearly, monthly and quarterly series of an
+    aggregated history
+    :return: JSON serialisable summary
+    """
+    monthly = fill_year_month(year_month(cube), first_day, last_day)
+    quarterly = fill_year_quarter(year_quarter(cube), first_day, last_day)
+    yearly = years(cube)
+    most_watched = top_shows(show_index, top_n)
+    duration = total_duration(cube)
+
+    return {'rows': int(cube['count'].sum()),
+            'first_day': first_day.strftime('%Y-%m-%d'),
+            'last_day': last_day.strftime('%Y-%m-%d'),
+            'hours': float(duration / 60),
+            'days': float(duration / 60 / 24),
+            'top_shows': [{'show': show, 'episodes': int(row['count']), 'hours': float(row['duration_hours'])}
+                          for show, row in most_watched.iterrows()],
+            'yearly': [{'year': int(y), 'hours': float(h)} for y, h in zip(yearly['year'], yearly['duration_hours'])],
+            'monthly': [{'year': int(y), 'month': int(m), 'hours': float(h)}
+                        for y, m, h in zip(monthly['year'], monthly['month'], monthly['duration_hours'])],
+            'quarterly': [{'year': int(y), 'quarter': int(q), 'hours': float(h)}
+                          for y, q, h in zip(quarterly['year'], quarterly['quarter'], quarterly['duration_hours'])]}
+
+
+def _summarise(task):
+    user, path, TV_show_duration, film_duration, top_n, cache_dir = task
+    try:
+        return user, path, summarise_file(path, TV_show_duration, film_duration, top_n, cache_dir), None
+    except Exception as error:
+        return user, path, None, '{}: {}'.format(type(error).__name__, error)
+
+
+def write_json(summaries, output):
+    for user, summary in summaries.items():
+        with open(os.path.join(output, user + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=1)
+
+
+def write_parquet(summaries, output):
+    """
+    One table per kind of result, every row tagged with its user
+    """
+    tables = {'summaries': [], 'top_shows': [], 'yearly': [], 'monthly': [], 'quarterly': []}
+    for user, summary in summaries.items():
+        tables['summaries'].append({'user': user, 'rows': summary['rows'], 'first_day': summary['first_day'],
+                                    'last_day': summary['last_day'], 'hours': summary['hours'], 'days': summary['days']})
+        for name in ['top_shows', 'yearly', 'monthly', 'quarterly']:
+            tables[name].extend(dict(row, user=user) for row in summary[name])
+
+    for name, rows in tables.items():
+        pd.DataFrame(rows).to_parquet(os.path.join(output, name + '.parquet'), index=False)
+
+
+def run(files, output, output_format='json', workers=None, TV_show_duration=TV_SHOW_DURATION,
+        film_duration=FILM_DURATION, top_n=10, cache_dir=None):
+    """
+    Summarise every file with a pool of worker processes and write the results
+    :return: summaries by user, errors by path and throughput statistics
+    """
+    os.makedirs(output, exist_ok=True)
+    tasks = [(user, path, TV_show_duration, film_duration, top_n, cache_dir) for user, path in zip(user_ids(files), files)]
+
+    summaries, errors = {}, {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for user, path, summary, error in pool.map(_summarise, tasks, chunksize=max(1, len(tasks) // 64)):
+            if error is None:
+                summaries[user] = summary
+            else:
+                errors[path] = error
+    elapsed = time.perf_counter() - start
+
+    if output_format == 'parquet':
+        write_parquet(summaries, output)
+    else:
+        write_json(summaries, output)
+
+    rows = sum(summary['rows'] for summary in summaries.values())
+    stats = {'files': len(summaries), 'failed': len(errors), 'rows': rows, 'seconds': elapsed,
+             'files_per_second': len(summaries) / elapsed if elapsed else 0.0,
+             'rows_per_second': rows / elapsed if elapsed else 0.0}
+
+    return summaries, errors, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse Netflix viewing history CSV files in parallel")
+    parser.add_argument('paths', nargs='+', help="CSV files, directories or glob patterns")
+    parser.add_argument('-o', '--output', default='summaries', help="output directory")
+    parser.add_argument('-f', '--format', choices=['json', 'parquet'], default='json')
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--tv-show-duration', type=float, default=TV_SHOW_DURATION, help="minutes per episode")
+    parser.add_argument('--film-duration', type=float, default=FILM_DURATION, help="minutes per film")
+    parser.add_argument('--top', type=int, default=10, help="number of top TV shows")
+    parser.add_argument('--cache', default=None, metavar='DIR',
+                        help="columnar cache of prepared histories, e.g. the app's '{}'".format(CACHE_DIR))
+    args = parser.parse_args(argv)
+
+    files = find_files(args.paths)
+    if not files:
+        parser.error("no CSV files found")
+
+    _, errors, stats = run(files, args.output, args.format, args.workers, args.tv_show_duration,
+                           args.film_duration, args.top, args.cache)
+
+    for path, error in errors.items():
+        print('{}: {}'.format(path, error), file=sys.stderr)
+    print("{files} files ({failed} failed), {rows} rows in {seconds:.2f} s: "
+          "{files_per_second:.1f} files/s, {rows_per_second:.0f} rows/s".format(**stats))
+
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+Benchmarks of the analysis pipeline on synthetic viewing histories.
+
+    python benchmark.py [classifier|dates|pipeline|startup] [rows ...] [--save FILE] [--compare FILE]
+
+The pipeline benchmark times every stage of the app, from parsing the CSV
+to each plot function and its interactive chart, and the sampled preview
+of large uploads (see preview.py), and records its wall time
+and peak traced memory. The startup benchmark times the imports and the
+plotting warm-up of a fresh interpreter (see warmup.py). Results can be
+saved as a baseline and later runs compared against it.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+import pandas as pd
+
+from classifier import classify_titles
+from dates import parse_dates
+from synthetic import generate_history
+
+
+REGRESSION_THRESHOLD = 1.25
+
+
+def measure(function, *args, memory=True):
+    """
+    Run a stage once to time it and, when memory is True, a second time under
+    tracemalloc to get its peak allocation (tracing slows the code down, so
+    both are not measured in the same run)
+    :return: result, seconds, peak MB (None when not measured)
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        function(*args)
+        peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+
+    return result, elapsed, peak
+
+
+def bench_classifier(sizes=(10000, 100000, 1000000, 10000000), memory=False):
+    records = []
+    for n_rows in sizes:
+        titles = generate_history(n_rows)['Title'].values
+        _, elapsed, peak = measure(classify_titles, titles, memory=memory)
+        records.append({'stage': 'classify_titles', 'rows': n_rows, 'seconds': elapsed, 'peak_mb': peak})
+    return records
+
+
+def bench_dates(sizes=(10000, 100000, 1000000), memory=False):
+    records = []
+    for n_rows in sizes:
+        dates = generate_history(n_rows)['Date']
+        _, elapsed, peak = measure(pd.to_datetime, dates, memory=memory)
+        records.append({'stage': 'pd.to_datetime (inferred)', 'rows': n_rows, 'seconds': elapsed, 'peak_mb': peak})
+        _, elapsed, peak = measure(parse_dates, dates.values, memory=memory)
+        records.append({'stage': 'parse_dates', 'rows': n_rows, 'seconds': elapsed, 'peak_mb': peak})
+    return records
+
+
+def bench_pipeline(sizes=(10000, 100000, 1000000), memory=True):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    import main_streamlit as app
+    from aggregation import build_cube, busiest_month
+    from charts import CHARTS
+    from ingest import read_history_chunks
+    from preview import estimate_history, sample_history
+    from sessions import binge_report
+    from shows import build_show_index
+
+    records = []
+    for n_rows in sizes:
+        buffer = BytesIO()
+        generate_history(n_rows).to_csv(buffer, index=False)
+        content = buffer.getvalue()
+
+        def record(stage, function, *args):
+            result, elapsed, peak = measure(function, *args, memory=memory)
+            records.append({'stage': stage, 'rows': n_rows, 'seconds': elapsed, 'peak_mb': peak})
+            return result
+
+        def preview(content):
+            sample, rows = sample_history(content)
+            sample_hist, _, _ = app.clean_and_prepare_data(sample)
+            return estimate_history(app.add_duration(sample_hist, 40, 100), rows)
+
+        def plot(function, *args):
+            plt.close(function(*args))
+
+        netflix_data = record('read csv', lambda: next(read_history_chunks(BytesIO(content), chunksize=n_rows + 1)))
+        netflix_hist, first_day, last_day = record('clean_and_prepare_data', app.clean_and_prepare_data, netflix_data)
+        netflix_hist = record('add_duration', app.add_duration, netflix_hist, 40, 100)
+        cube = record('build_cube', build_cube, netflix_hist)
+        show_index = record('build_show_index', build_show_index, netflix_hist)
+        month_year_groupby = record('year_month_info', app.year_month_info, cube, first_day, last_day)
+        quarter_year_groupby = record('year_quarter_info', app.year_quarter_info, cube, first_day, last_day)
+        most_watched = record('TV_shows_ranking_plot', app.TV_shows_ranking_plot, netflix_hist, show_index)
+        record('binge_report', binge_report, netflix_hist)
+        record('preview', lambda: preview(content))
+        month_chosen, year_chosen = busiest_month(cube)
+
+        record('plot_year_month', plot, app.plot_year_month, month_year_groupby)
+        record('plot_year_quarter', plot, app.plot_year_quarter, quarter_year_groupby)
+        record('plot_day', plot, app.plot_day, cube, month_chosen, year_chosen)
+        record('plot_most_watched', plot, app.plot_most_watched, most_watched)
+        record('plot_overall_distribution', plot, app.plot_overall_distribution, cube)
+        record('distribution_quarter_year', plot, app.distribution_quarter_year, cube, quarter_year_groupby, first_day, last_day)
+        record('plot_monthly_distribution', plot, app.plot_monthly_distribution, month_year_groupby, first_day, last_day)
+        record('plot_weekday_distribution', plot, app.plot_weekday_distribution, cube)
+
+        # The same figures as Vega-Lite specs, serialised as they are sent to the browser
+        chart_args = {'plot_year_month': (month_year_groupby,), 'plot_year_quarter': (quarter_year_groupby,),
+                      'plot_day': (cube, month_chosen, year_chosen), 'plot_most_watched': (most_watched,),
+                      'plot_overall_distribution': (cube,),
+                      'distribution_quarter_year': (cube, quarter_year_groupby, first_day, last_day),
+                      'plot_monthly_distribution': (month_year_groupby, first_day, last_day),
+                      'plot_weekday_distribution': (cube,)}
+        for name, chart in CHARTS.items():
+            record(chart.__name__, lambda *args: chart(*args).to_json(), *chart_args[name])
+
+    return records
+
+
+def bench_startup(sizes=(1,), memory=False):
+    """
+    Cold start: imports and plotting warm-up in a fresh interpreter, as on a
+    new dyno (the rows column holds the run number)
+    """
+    records = []
+    for run in range(1, max(sizes) + 1):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, 'warmup.py', '--json'], check=True, stdout=subprocess.PIPE,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        elapsed = time.perf_counter() - start
+        records.extend({'stage': r['stage'], 'rows': run, 'seconds': r['seconds'], 'peak_mb': None}
+                       for r in json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+        records.append({'stage': 'process', 'rows': run, 'seconds': elapsed, 'peak_mb': None})
+    return records
+
+
+BENCHMARKS = {'classifier': bench_classifier, 'dates': bench_dates, 'pipeline': bench_pipeline,
+              'startup': bench_startup}
+
+
+def print_records(records, baseline=None):
+    print('{:<32} {:>10} {:>10} {:>10} {:>10}'.format('stage', 'rows', 'seconds', 'peak MB', 'vs base'))
+    for record in records:
+        peak = '' if record['peak_mb'] is None else '{:.1f}'.format(record['peak_mb'])
+        ratio = ''
+        if baseline and (record['stage'], record['rows']) in baseline:
+            ratio = '{:.2f}x'.format(record['seconds'] / max(baseline[record['stage'], record['rows']], 1e-9))
+        print('{:<32} {:>10} {:>10.4f} {:>10} {:>10}'.format(record['stage'], record['rows'], record['seconds'], peak, ratio))
+
+
+def regressions(records, baseline, threshold=REGRESSION_THRESHOLD):
+    return [record for record in records
+            if (record['stage'], record['rows']) in baseline
+            and record['seconds'] > threshold * baseline[record['stage'], record['rows']]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Netflix viewing history analysis")
+    parser.add_argument('benchmark', nargs='?', choices=list(BENCHMARKS), default=None)
+    parser.add_argument('rows', nargs='*', type=int, help="history sizes, from 10k to 10M rows")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc runs")
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON file to compare with")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="slowdown factor reported as a regression")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r['stage'], r['rows']): r['seconds'] for r in json.load(f)}
+
+    records = []
+    for name in [args.benchmark] if args.benchmark else list(BENCHMARKS):
+        print('## ' + name)
+        kwargs = {'memory': not args.no_memory}
+        if args.rows:
+            kwargs['sizes'] = args.rows
+        stage_records = BENCHMARKS[name](**kwargs)
+        print_records(stage_records, baseline)
+        records.extend(stage_records)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(records, f, indent=1)
+
+    if baseline:
+        slower = regressions(records, baseline, args.threshold)
+        for record in slower:
+            print('REGRESSION {stage} ({rows} rows): {seconds:.4f} s'.format(**record))
+        return 1 if slower else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+import hashlib
+import numbers
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def _params(params):
+    """
+    repr of the parameters of a key, with numbers as floats: a duration of 40
+    given by the app and 40.0 given by the batch CLI are the same result
+    """
+    params = tuple(float(p) if isinstance(p, numbers.Real) and not isinstance(p, bool) else p for p in params)
+    return repr(params).encode('utf-8')
+
+
+def content_key(content, *params):
+    """
+    Key identifying a result: hash of the uploaded bytes plus the parameters
+    that were used to compute it (e.g. the TV show and film durations)
+    """
+    digest = hashlib.blake2b(content, digest_size=20)
+    digest.update(_params(params))
+    return digest.hexdigest()
+
+
+def file_key(path, *params, block_size=1024 ** 2):
+    """
+    content_key of a file on disk, hashed block by block
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    digest.update(_params(params))
+    return digest.hexdigest()
+
+
+def size_of(value):
+    """
+    Approximate memory footprint of a cached value in bytes
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(size_of(k) + size_of(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(size_of(v) for v in value)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class ResultCache(object):
+    """
+    Least recently used cache with a cap on the number of entries and on the
+    total memory they take. It lives at module level, so it survives the
+    Streamlit reruns of the main script.
+    """
+
+    def __init__(self, max_entries=16, max_bytes=512 * 1024 ** 2):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        """
+        Store (or refresh the size of) a value and evict the least recently
+        used entries until the cache fits in its limits again
+        """
+        size = size_of(value)
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+
+            # A value bigger than the whole cache is not worth keeping
+            if size > self.max_bytes:
+                return value
+
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+results = ResultCache()
@@ -0,0 +1,170 @@
+"""
+Vega-Lite versions of the report figures, drawn in the browser by
+st.altair_chart. Only the small aggregated series are sent to the client,
+instead of a PNG rasterised on the server.
+
+Every chart takes the same arguments as the matplotlib function it replaces
+and is registered in CHARTS under that function's name.
+"""
+import altair as alt
+import pandas as pd
+
+from aggregation import content_type, fill_month_day, fill_weekday, month_days, weekday_type, year_quarter_type
+
+
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+CONTENT_NAMES = {True: "TV shows", False: "Films"}
+
+HOURS = alt.Y('hours:Q', title='Watched hours')
+
+
+def _bars_by_period(data, label, title):
+    """
+    One bar per period, coloured by year, in the order of data
+    """
+    data = pd.DataFrame({'period': data[label].values, 'year': data['year'].values.astype(int),
+                         'hours': data['duration_hours'].values.round(2)})
+
+    return alt.Chart(data, title=title).mark_bar().encode(
+        x=alt.X('period:N', sort=list(data['period']), title=''),
+        y=HOURS,
+        color=alt.Color('year:N', title='Year'),
+        tooltip=['period', 'hours'])
+
+
+def year_month_chart(month_year_groupby):
+    return _bars_by_period(month_year_groupby, 'month-year', 'Distribution of watched hours across months')
+
+
+def year_quarter_chart(quarter_year_groupby):
+    return _bars_by_period(quarter_year_groupby, 'quarter-year', 'Distribution of watched hours across quarters of the year')
+
+
+def day_chart(cube, month_chosen, year_chosen):
+    days = month_days(cube, year_chosen, month_chosen)
+    days = fill_month_day(days[['day', 'duration_hours']], year_chosen, month_chosen)
+    data = pd.DataFrame({'day': days['day'].values.astype(int), 'hours': days['duration_hours'].values.round(2)})
+
+    return alt.Chart(data).mark_bar().encode(
+        x=alt.X('day:O', title=''),
+        y=HOURS,
+        tooltip=['day', 'hours'])
+
+
+def most_watched_chart(most_watched):
+    data = pd.DataFrame({'show': most_watched.index.astype(str), 'episodes': most_watched['count'].values.astype(int),
+                         'hours': most_watched['duration_hours'].values.round(2)})
+
+    return alt.Chart(data).mark_bar().encode(
+        x=alt.X('hours:Q', title='Watched hours'),
+        y=alt.Y('show:N', sort=list(data['show']), title=''),
+        tooltip=['show', 'episodes', 'hours'])
+
+
+def overall_distribution_chart(cube):
+    """
+    Share of TV shows and films as a single normalised bar (the arc mark of
+    a pie is not available in the Vega-Lite version of older Streamlit)
+    """
+    shares = content_type(cube)
+    data = pd.DataFrame({'content': shares['is_TV_show'].map(CONTENT_NAMES).values,
+                         'hours': shares['duration_hours'].values.round(2),
+                         'share': (shares['duration'] / shares['duration'].sum() * 100).values.round(1)})
+
+    return alt.Chart(data, title='Overall distribution').mark_bar().encode(
+        x=alt.X('sum(hours):Q', stack='normalize', title='Share of watched hours'),
+        color=alt.Color('content:N', title=''),
+        tooltip=['content', 'hours', 'share'])
+
+
+def quarter_year_distribution_chart(cube, quarter_year_groupby, first_day, last_day):
+    periods = quarter_year_groupby[['year', 'quarter_id', 'quarter-year']]
+    by_type = year_quarter_type(cube)
+
+    lines = [pd.DataFrame({'period': periods['quarter-year'].values, 'content': 'Total',
+                           'hours': quarter_year_groupby['duration_hours'].values})]
+    for is_TV_show, name in CONTENT_NAMES.items():
+        quarters = by_type[by_type['is_TV_show'] == is_TV_show][['year', 'quarter', 'duration_hours']]
+        # Align on the quarters of the total, which already cover the whole period
+        quarters = periods.merge(quarters.rename(columns={'quarter': 'quarter_id'}), on=['year', 'quarter_id'],
+                                 how='left').fillna({'duration_hours': 0})
+        lines.append(pd.DataFrame({'period': quarters['quarter-year'].values, 'content': name,
+                                   'hours': quarters['duration_hours'].values}))
+    data = pd.concat(lines, ignore_index=True)
+    data['hours'] = data['hours'].round(2)
+
+    return alt.Chart(data, title='Distribution between TV shows and films during the years').mark_line(point=True).encode(
+        x=alt.X('period:N', sort=list(periods['quarter-year']), title=''),
+        y=HOURS,
+        color=alt.Color('content:N', title=''),
+        tooltip=['period', 'content', 'hours'])
+
+
+def monthly_distribution_chart(month_year_groupby, first_day, last_day):
+    data = pd.DataFrame({'month': month_year_groupby['month_name'].values,
+                         'year': month_year_groupby['year'].values.astype(int),
+                         'hours': month_year_groupby['duration_hours'].values.round(2)})
+
+    return alt.Chart(data, title='Distribution of monthly watched hours during the years').mark_line(point=True).encode(
+        x=alt.X('month:N', sort=MONTH_NAMES, title=''),
+        y=HOURS,
+        color=alt.Color('year:N', title='Year'),
+        tooltip=['month', 'year', 'hours'])
+
+
+def weekday_distribution_chart(cube):
+    weekdays = weekday_type(cube)
+    stacks = []
+    for is_TV_show, name in CONTENT_NAMES.items():
+        days = fill_weekday(weekdays[weekdays['is_TV_show'] == is_TV_show][['weekday', 'duration_hours']])
+        stacks.append(pd.DataFrame({'weekday': [WEEKDAY_NAMES[d] for d in days['weekday']], 'content': name,
+                                    'hours': days['duration_hours'].values.round(2)}))
+
+    return alt.Chart(pd.concat(stacks, ignore_index=True),
+                     title='Distribution of watched hours during the each day of the week').mark_bar().encode(
+        x=alt.X('weekday:N', sort=WEEKDAY_NAMES, title=''),
+        y=alt.Y('sum(hours):Q', title='Watched hours'),
+        color=alt.Color('content:N', title=''),
+        tooltip=['weekday', 'content', 'hours'])
+
+
+def profiles_chart(periods, title):
+    """
+    One line per profile (household mode)
+    :param periods: watched hours with the periods as rows, in order, and one column per profile
+    """
+    data = pd.DataFrame({'period': list(periods.index) * len(periods.columns),
+                         'profile': [str(profile) for profile in periods.columns for _ in periods.index],
+                         'hours': periods.values.T.ravel().round(2)})
+
+    return alt.Chart(data, title=title).mark_line(point=True).encode(
+        x=alt.X('period:N', sort=list(periods.index), title=''),
+        y=HOURS,
+        color=alt.Color('profile:N', title='Profile'),
+        tooltip=['period', 'profile', 'hours'])
+
+
+def estimate_chart(months):
+    """
+    Estimated watched hours across months with their 95% bounds (preview)
+    """
+    data = pd.DataFrame({'period': ['{}-{}'.format(MONTH_NAMES[m - 1], y) for y, m in zip(months['year'], months['month'])],
+                         'hours': months['hours'].values.round(1), 'low': months['low'].values.round(1),
+                         'high': months['high'].values.round(1)})
+    x = alt.X('period:N', sort=list(data['period']), title='')
+    bars = alt.Chart(data, title='Estimated watched hours across months').mark_bar(opacity=0.6).encode(
+        x=x, y=HOURS, tooltip=['period', 'hours', 'low', 'high'])
+    bounds = alt.Chart(data).mark_rule().encode(x=x, y='low:Q', y2='high:Q')
+
+    return bars + bounds
+
+
+CHARTS = {'plot_year_month': year_month_chart,
+          'plot_year_quarter': year_quarter_chart,
+          'plot_day': day_chart,
+          'plot_most_watched': most_watched_chart,
+          'plot_overall_distribution': overall_distribution_chart,
+          'distribution_quarter_year': quarter_year_distribution_chart,
+          'plot_monthly_distribution': monthly_distribution_chart,
+          'plot_weekday_distribution': weekday_distribution_chart}
@@ -0,0 +1,66 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# Substrings that mark a title as an episode of a TV show, grouped by the
+# language of the Netflix export. Matching is case sensitive, as in the
+# original per-row check.
+TV_SHOW_KEYWORDS = {
+    'es': ['Temporada', 'Serie', 'Miniserie', 'Capítulo', 'Parte'],
+    'en': ['Season', 'Episode'],
+    # Titles that do not carry any of the usual markers
+    'special': ['Spartacus: Sangre y Arena​:'],
+}
+
+
+def register_keywords(locale, keywords):
+    """
+    Add TV show keywords for a locale (new or existing)
+    """
+    known = TV_SHOW_KEYWORDS.setdefault(locale, [])
+    for keyword in keywords:
+        if keyword not in known:
+            known.append(keyword)
+
+
+def get_keywords(locales=None, extra_keywords=None):
+    if locales is None:
+        locales = list(TV_SHOW_KEYWORDS)
+
+    keywords = []
+    for locale in locales:
+        keywords.extend(TV_SHOW_KEYWORDS.get(locale, []))
+    if extra_keywords:
+        keywords.extend(extra_keywords)
+
+    # Preserve order but drop duplicates
+    return list(dict.fromkeys(keywords))
+
+
+def compile_keywords(keywords):
+    # Longest first so that the alternation does not stop at a shorter prefix
+    keywords = sorted(keywords, key=len, reverse=True)
+    return re.compile('|'.join(re.escape(k) for k in keywords))
+
+
+def classify_titles(titles, locales=None, extra_keywords=None):
+    """
+    Return a boolean array telling whether each title is a TV show episode.
+    Every distinct title is matched once against a single compiled regex and
+    the result is broadcast back to all the rows sharing that title.
+    :return: numpy bool array aligned with titles
+    """
+    keywords = get_keywords(locales, extra_keywords)
+    if len(titles) == 0 or not keywords:
+        return np.zeros(len(titles), dtype=bool)
+
+    if isinstance(titles, (pd.Categorical, pd.CategoricalIndex)):
+        codes, uniques = titles.codes, titles.categories.astype(str)
+    else:
+        codes, uniques = pd.factorize(pd.Series(titles).astype(str))
+    pattern = compile_keywords(keywords)
+    unique_is_TV_show = np.fromiter((pattern.search(t) is not None for t in uniques), dtype=bool, count=len(uniques))
+
+    return unique_is_TV_show[codes]
@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from history import derive_show_names
+
+
+FORMAT_VERSION = 1
+CACHE_DIR = 'cache'
+CACHE_MAX_ENTRIES = 64
+
+# Column name -> dtype of its .npy file. The title codes keep the dtype pandas
+# gives them, so that the Categorical is built over the mapped file as it is
+COLUMNS = {'day_number': np.int32, 'title_codes': None, 'is_TV_show': np.bool_, 'duration': np.float32}
+
+# pandas >= 1.3 keeps the arrays of a dict as they are with copy=False. Older
+# versions (1.0 to 1.2, as pinned in requirements.txt) stack them into new
+# blocks, so for those the blocks are built with the pandas internals
+# (BlockManager and make_block) of these versions, which pandas 2 deprecates.
+DICT_WITHOUT_COPY = tuple(int(part) for part in pd.__version__.split('.')[:2]) >= (1, 3)
+
+
+def save_columns(netflix_hist, directory, **meta):
+    """
+    Write a prepared history (after clean_and_prepare_data and add_duration)
+    as one .npy file per column plus the distinct titles and a meta.json.
+    The files are written next to the target and renamed into place, so
+    readers never see a half written history. When another writer saved the
+    same history first, its files are kept, as other processes may have
+    mapped them.
+    """
+    titles = netflix_hist.index
+    if not isinstance(titles, pd.CategoricalIndex):
+        titles = pd.CategoricalIndex(titles)
+
+    columns = {'day_number': netflix_hist['day_number'].values,
+               'title_codes': titles.codes,
+               'is_TV_show': netflix_hist['is_TV_show'].values,
+               'duration': netflix_hist['duration'].values}
+
+    parent, name = os.path.split(directory)
+    os.makedirs(parent or '.', exist_ok=True)
+    tmp_directory = tempfile.mkdtemp(prefix=name + '.tmp-', dir=parent or '.')
+    for name, dtype in COLUMNS.items():
+        np.save(os.path.join(tmp_directory, name + '.npy'), np.ascontiguousarray(columns[name], dtype=dtype))
+    with open(os.path.join(tmp_directory, 'titles.json'), 'w', encoding='utf-8') as f:
+        json.dump([str(t) for t in titles.categories], f, ensure_ascii=False)
+    with open(os.path.join(tmp_directory, 'meta.json'), 'w') as f:
+        json.dump(dict(meta, version=FORMAT_VERSION, rows=len(netflix_hist)), f)
+
+    try:
+        os.replace(tmp_directory, directory)
+    except OSError:
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        if not os.path.isdir(directory):
+            raise
+
+
+def map_columns(directory):
+    """
+    Memory-map the columns of a saved history: nothing is parsed or copied and
+    every process mapping the same files shares their pages
+    :return: dict of read-only numpy arrays, list of titles, meta dict
+    """
+    with open(os.path.join(directory, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != FORMAT_VERSION:
+        raise ValueError("Unsupported columnar history version: {}".format(meta.get('version')))
+
+    columns = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r') for name in COLUMNS}
+    with open(os.path.join(directory, 'titles.json'), encoding='utf-8') as f:
+        titles = json.load(f)
+
+    return columns, titles, meta
+
+
+def history_from_columns(columns, titles):
+    """
+    Compact history DataFrame (as built by clean_and_prepare_data, with its
+    duration column) over the mapped columns, without copying them. Only the
+    TV_show column is computed.
+    """
+    titles = pd.Categorical.from_codes(np.asarray(columns['title_codes']), categories=titles)
+    values = {'day_number': np.asarray(columns['day_number']),
+              'is_TV_show': np.asarray(columns['is_TV_show']),
+              'TV_show': derive_show_names(titles),
+              'duration': np.asarray(columns['duration'])}
+
+    index = pd.CategoricalIndex(titles, name='Title')
+    if DICT_WITHOUT_COPY:
+        return pd.DataFrame(values, index=index, copy=False)
+
+    # One block per column. The dtypes are all different, so pandas never
+    # consolidates these blocks either.
+    from pandas.core.internals import BlockManager, make_block
+
+    blocks = [make_block(column if isinstance(column, pd.Categorical) else column.reshape(1, -1), placement=[i], ndim=2)
+              for i, column in enumerate(values.values())]
+    return pd.DataFrame(BlockManager(blocks, [pd.Index(list(values)), index]))
+
+
+def cache_directory(key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, key)
+
+
+def prune_cache(cache_dir=CACHE_DIR, max_entries=CACHE_MAX_ENTRIES):
+    """
+    Remove the least recently written histories beyond max_entries
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if '.tmp-' not in name]
+    entries = sorted((e for e in entries if os.path.isdir(e)), key=os.path.getmtime, reverse=True)
+    for entry in entries[max_entries:]:
+        shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+
+# Formats found in Netflix exports, day first before month first so that a
+# sample where every day is <= 12 is read the European way, like the bundled
+# NetflixViewingHistory.csv (dd/mm/yy)
+DATE_FORMATS = ['%d/%m/%y', '%d/%m/%Y', '%m/%d/%y', '%m/%d/%Y', '%Y-%m-%d', '%d.%m.%y', '%d.%m.%Y', '%d-%m-%Y', '%Y/%m/%d']
+SAMPLE_SIZE = 1000
+
+
+def detect_date_format(dates, sample_size=SAMPLE_SIZE):
+    """
+    Find the first format of DATE_FORMATS that parses every date of a sample
+    of the distinct values
+    :return: format string, or None when no known format fits
+    """
+    sample = pd.unique(pd.Series(dates).dropna().astype(str))
+    if len(sample) > sample_size:
+        # Spread the sample over the whole column, not only its first rows
+        sample = sample[np.linspace(0, len(sample) - 1, sample_size).astype(int)]
+
+    for date_format in DATE_FORMATS:
+        try:
+            pd.to_datetime(sample, format=date_format)
+        except (ValueError, TypeError):
+            continue
+        return date_format
+
+    return None
+
+
+def parse_dates(dates, date_format=None):
+    """
+    Parse a column of date strings with a fixed format. Viewing logs repeat the
+    same date many times, so only the distinct strings are parsed and the
+    result is mapped back to every row.
+    :return: DatetimeIndex aligned with dates
+    """
+    codes, uniques = pd.factorize(np.asarray(dates))
+    if date_format is None:
+        date_format = detect_date_format(uniques)
+
+    if date_format is None:
+        parsed = pd.to_datetime(uniques)
+    else:
+        parsed = pd.to_datetime(uniques, format=date_format)
+
+    return pd.DatetimeIndex(parsed.take(codes))
+
+
+def to_day_number(dates):
+    """
+    Days since 1970-01-01 as int32, 4 bytes per row instead of 8
+    """
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int32)
+
+
+def from_day_number(day_numbers):
+    return pd.DatetimeIndex(np.asarray(day_numbers).astype('datetime64[D]'))
+
+
+def calendar_fields(day_numbers):
+    """
+    Derive the calendar fields of day numbers on demand, in the smallest
+    integer types that hold them
+    :return: dict of numpy arrays: year, quarter, month, day, weekday (Monday=0)
+    """
+    days = np.asarray(day_numbers).astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    month = (months.astype(np.int64) % 12 + 1).astype(np.uint8)
+
+    return {'year': (days.astype('datetime64[Y]').astype(np.int64) + 1970).astype(np.uint16),
+            'quarter': ((month - 1) // 3 + 1).astype(np.uint8),
+            'month': month,
+            'day': ((days - months).astype(np.int64) + 1).astype(np.uint8),
+            # 1970-01-01 was a Thursday
+            'weekday': ((np.asarray(day_numbers, dtype=np.int64) + 3) % 7).astype(np.uint8)}
@@ -0,0 +1,100 @@
+import hashlib
+import os
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+
+CATALOG_PATH = 'catalog.csv'
+
+_catalogs = {}
+
+
+class Catalog(object):
+    """
+    Runtimes in minutes by title or by TV show name. Titles are looked up
+    through a hash index over the distinct titles of a history, never row by
+    row: an exact title match comes first, then (for TV shows) the show
+    name, then the flat TV show or film duration. The resolved runtimes are
+    not cached here: they are saved with the prepared history (see
+    columnar.py), which a new upload of the same file maps as it is.
+    """
+
+    def __init__(self, runtimes=None, key=''):
+        runtimes = pd.Series(runtimes if runtimes is not None else {}, dtype=np.float32)
+        self.runtimes = runtimes[~runtimes.index.duplicated(keep='last')]
+        self.index = pd.Index(self.runtimes.index)
+        self.key = key
+
+    def __len__(self):
+        return len(self.runtimes)
+
+    def resolve(self, titles, is_TV_show, TV_show_duration, film_duration):
+        """
+        Runtime of every distinct title
+        :param titles: distinct titles
+        :param is_TV_show: bool array aligned with titles
+        :return: float32 array aligned with titles
+        """
+        titles = pd.Index(titles)
+        is_TV_show = np.asarray(is_TV_show, dtype=bool)
+        fallback = np.where(is_TV_show, TV_show_duration, film_duration).astype(np.float32)
+        if len(self) == 0:
+            return fallback
+
+        values = self.runtimes.values
+        position = self.index.get_indexer(titles)
+        shows = pd.Index(pd.Series(titles.astype(str)).str.split(':', n=1).str[0].str.strip())
+        show_position = np.where(is_TV_show, self.index.get_indexer(shows), -1)
+
+        return np.where(position >= 0, values[position],
+                        np.where(show_position >= 0, values[show_position], fallback)).astype(np.float32)
+
+    def durations(self, netflix_hist, TV_show_duration, film_duration):
+        """
+        Runtime of every row of a compact history (see history.make_history)
+        """
+        titles = netflix_hist.index
+        if not isinstance(titles, pd.CategoricalIndex):
+            titles = pd.CategoricalIndex(titles)
+        codes = titles.codes
+
+        # is_TV_show only depends on the title, so one value per category is enough
+        is_TV_show = np.zeros(len(titles.categories), dtype=bool)
+        is_TV_show[codes] = netflix_hist['is_TV_show'].values
+
+        return self.resolve(titles.categories, is_TV_show, TV_show_duration, film_duration)[codes]
+
+
+def read_catalog(path):
+    """
+    Catalog CSV: a Title column (an exact title of the viewing history or a
+    TV show name) and a Minutes column
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    table = pd.read_csv(BytesIO(content), usecols=['Title', 'Minutes'], dtype={'Title': str})
+    table = table.dropna()
+    table['Title'] = table['Title'].str.strip()
+
+    return Catalog(dict(zip(table['Title'], table['Minutes'])), key=hashlib.blake2b(content, digest_size=20).hexdigest())
+
+
+def load_catalog(path=CATALOG_PATH):
+    """
+    Catalog at path, read again only when the file changes. The catalog lives
+    at module level, so it is shared by the Streamlit sessions and reruns of
+    the server process.
+    :return: Catalog, empty when there is no file
+    """
+    if not os.path.isfile(path):
+        return Catalog()
+
+    stat = os.stat(path)
+    signature = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    catalog = _catalogs.get(signature[0])
+    if catalog is None or catalog[0] != signature:
+        catalog = _catalogs[signature[0]] = (signature, read_catalog(path))
+
+    return catalog[1]
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+def derive_show_names(titles):
+    """
+    Show name of every title (the part before the first colon), computed once
+    per distinct title
+    :return: Categorical aligned with titles
+    """
+    shows = pd.Series(titles.categories).str.split(':', n=1).str[0]
+    codes, show_names = pd.factorize(shows)
+
+    return pd.Categorical.from_codes(codes[titles.codes], categories=show_names)
+
+
+def make_history(day_numbers, titles, is_TV_show):
+    """
+    Compact viewing history: Title index and TV_show as categoricals, the date
+    as an int32 day number (see dates.calendar_fields) and is_TV_show as bool
+    """
+    return pd.DataFrame({'day_number': np.asarray(day_numbers, dtype=np.int32),
+                         'is_TV_show': np.asarray(is_TV_show, dtype=bool),
+                         'TV_show': derive_show_names(titles)},
+                        index=pd.CategoricalIndex(titles, name='Title'))
+
+
+def concat_histories(histories):
+    """
+    Concatenate compact histories, merging the categories so that the Title
+    and TV_show columns stay categorical
+    """
+    if len(histories) == 1:
+        return histories[0]
+
+    first = histories[0]
+    columns = {}
+    for column in first.columns:
+        if isinstance(first[column].dtype, pd.CategoricalDtype):
+            columns[column] = union_categoricals([h[column].values for h in histories])
+        else:
+            columns[column] = np.concatenate([h[column].values for h in histories])
+    titles = union_categoricals([h.index.values for h in histories])
+
+    return pd.DataFrame(columns, index=pd.CategoricalIndex(titles, name=first.index.name))
@@ -0,0 +1,108 @@
+"""
+Household mode: the exports of several profiles analysed together. Every
+file is parsed and classified in a worker process, the histories are tagged
+with their profile and concatenated, and the cube and show index are built
+once, keyed by profile. The combined report is a slice of those over every
+profile, and the side by side views are slices keyed by profile.
+"""
+import os
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from aggregation import build_cube, slice_cube
+from history import concat_histories
+from pipeline import prepare_history
+from render import MAX_WORKERS, run_in_pool
+from shows import build_show_index, top_shows_by
+
+
+PROFILE_KEY = 'profile'
+
+
+def profile_names(file_names):
+    """
+    Profile name of every file: its name without extension, numbered when
+    it is already the name of another file
+    """
+    names = []
+    for file_name in file_names:
+        base = os.path.splitext(os.path.basename(file_name))[0] or 'profile'
+        name, number = base, 1
+        while name in names:
+            number += 1
+            name = '{} ({})'.format(base, number)
+        names.append(name)
+
+    return names
+
+
+def prepare_profile(content, key, TV_show_duration, film_duration):
+    """
+    Clean, classify and add the durations of one export, through the
+    columnar cache. Usually runs in a worker process.
+    :return: history, first day, last day
+    """
+    netflix_hist, _, _, first_day, last_day = prepare_history(BytesIO(content), key, TV_show_duration, film_duration,
+                                                              aggregate=False)
+    return netflix_hist, first_day, last_day
+
+
+def prepare_profiles(contents, keys, TV_show_duration, film_duration, max_workers=MAX_WORKERS):
+    """
+    prepare_profile on every export, in parallel in the shared worker pool
+    :return: list of (history, first day, last day) in the order of contents
+    """
+    tasks = [(i, (content, key, TV_show_duration, film_duration)) for i, (content, key) in enumerate(zip(contents, keys))]
+    prepared = [None] * len(tasks)
+    for i, profile in run_in_pool(prepare_profile, tasks, max_workers):
+        prepared[i] = profile
+
+    return prepared
+
+
+def household_history(histories, names):
+    """
+    Concatenate the histories of the profiles, with the profile of every row
+    as a categorical column
+    """
+    netflix_hist = concat_histories(histories)
+    codes = np.repeat(np.arange(len(names)), [len(h) for h in histories])
+    netflix_hist[PROFILE_KEY] = pd.Categorical.from_codes(codes, categories=names)
+
+    return netflix_hist
+
+
+def household_aggregates(netflix_hist):
+    """
+    Cube and show index of the household, keyed by profile, in a single pass
+    over the history each
+    """
+    return build_cube(netflix_hist, keys=(PROFILE_KEY,)), build_show_index(netflix_hist, keys=(PROFILE_KEY,))
+
+
+def profile_totals(cube):
+    """
+    Watched hours, titles and share of TV shows of every profile
+    """
+    totals = slice_cube(cube, [PROFILE_KEY]).set_index(PROFILE_KEY)
+    TV_shows = slice_cube(cube, [PROFILE_KEY], is_TV_show=True).set_index(PROFILE_KEY)
+    totals['TV_show_share'] = TV_shows['duration'].reindex(totals.index, fill_value=0) / totals['duration'] * 100
+
+    return totals[['duration_hours', 'count', 'TV_show_share']]
+
+
+def profile_periods(cube, by):
+    """
+    Watched hours by profile and period (e.g. by=['year', 'month']), every
+    profile on every period of the household
+    :return: DataFrame with the period keys as rows and one column per profile
+    """
+    periods = slice_cube(cube, [PROFILE_KEY] + list(by))
+    return periods.pivot_table(values='duration_hours', index=list(by), columns=PROFILE_KEY, aggfunc='sum',
+                               fill_value=0)
+
+
+def profile_top_shows(show_index, n=10):
+    return top_shows_by(show_index, PROFILE_KEY, n)
@@ -0,0 +1,23 @@
+import pandas as pd
+
+
+HISTORY_COLUMNS = ['Date', 'Title']
+HISTORY_DTYPES = {'Date': str, 'Title': str}
+CHUNKSIZE = 200000
+
+
+def read_history_chunks(source, chunksize=CHUNKSIZE):
+    """
+    Read a Netflix viewing history CSV (path or file object) in chunks of at
+    most chunksize rows, with the Date and Title columns kept as strings.
+    Rows with a missing Date or Title are dropped.
+    :return: iterator of DataFrames
+    """
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+    reader = pd.read_csv(source, usecols=HISTORY_COLUMNS, dtype=HISTORY_DTYPES, chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk.dropna()
+        if len(chunk) > 0:
+            yield chunk
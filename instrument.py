@@ -0,0 +1,172 @@
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+logger = logging.getLogger('netflixanalysis.metrics')
+
+# tracemalloc is process wide: it is started by the first run that traces
+# memory and stopped when the last one is closed
+_tracing_runs = 0
+_started_tracing = False
+_tracing_lock = threading.Lock()
+
+
+def configure_logging(level=logging.INFO):
+    """
+    Send the metrics to stderr, one JSON document per line, unless the
+    logger has already been configured
+    """
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = False
+
+
+def _start_tracing():
+    global _tracing_runs, _started_tracing
+    with _tracing_lock:
+        if _tracing_runs == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_runs += 1
+
+
+def _stop_tracing():
+    global _tracing_runs, _started_tracing
+    with _tracing_lock:
+        _tracing_runs -= 1
+        if _tracing_runs == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+def max_rss_mb():
+    """
+    Peak resident memory of the process so far (Linux reports it in KB)
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Recorder(object):
+    """
+    Wall time, rows processed and memory of every stage of one run of the
+    page. Stages with the same name (e.g. one per CSV chunk) are added up.
+    With trace_memory=True the peak memory allocated by each stage is also
+    traced, which slows the run down, so it is only done on demand, until
+    the recorder is closed (it is a context manager).
+    """
+
+    def __init__(self, run_id=None, trace_memory=False):
+        self.run_id = run_id
+        self.trace_memory = trace_memory
+        self.stages = OrderedDict()
+        self._tracing = False
+        if trace_memory:
+            _start_tracing()
+            self._tracing = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Stop tracing memory for this run. Tracing stops once every run that
+        traces memory is closed.
+        """
+        if self._tracing:
+            self._tracing = False
+            _stop_tracing()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Measure the code in the with block. The yielded dict can be updated
+        with the number of rows once it is known.
+        """
+        info = {'rows': rows}
+        if self.trace_memory:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.clear_traces()
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            elapsed = time.perf_counter() - start
+            traced = tracemalloc.get_traced_memory()[1] / 1024 ** 2 if self.trace_memory else None
+            self.add(name, elapsed, info['rows'], traced)
+
+    def add(self, name, seconds, rows=None, traced_peak_mb=None, calls=1):
+        record = self.stages.setdefault(name, {'stage': name, 'calls': 0, 'seconds': 0.0, 'rows': None,
+                                               'traced_peak_mb': None, 'max_rss_mb': None})
+        record['calls'] += calls
+        record['seconds'] += seconds
+        if rows is not None:
+            record['rows'] = (record['rows'] or 0) + rows
+        if traced_peak_mb is not None:
+            record['traced_peak_mb'] = max(record['traced_peak_mb'] or 0, traced_peak_mb)
+        record['max_rss_mb'] = max_rss_mb()
+
+    def merge(self, other):
+        """
+        Add the stages of another recorder, e.g. of the part of the run done
+        in another thread, which records its stages on its own
+        """
+        for record in other.records():
+            self.add(record['stage'], record['seconds'], record['rows'], record['traced_peak_mb'], record['calls'])
+
+    def records(self):
+        return list(self.stages.values())
+
+    def emit(self):
+        """
+        Log one JSON line per stage so runs can be aggregated across sessions
+        """
+        for record in self.records():
+            logger.info(json.dumps(dict(record, run_id=self.run_id)))
+
+
+@contextmanager
+def stage(recorder, name, rows=None):
+    """
+    recorder.stage(name, rows), or nothing at all when there is no recorder
+    """
+    if recorder is None:
+        yield {'rows': rows}
+    else:
+        with recorder.stage(name, rows) as info:
+            yield info
+
+
+def timed_chunks(recorder, name, chunks):
+    """
+    Iterate over chunks, recording the time spent producing each one and its
+    number of rows under the given stage name
+    """
+    chunks = iter(chunks)
+    while True:
+        with stage(recorder, name) as info:
+            chunk = next(chunks, None)
+            if chunk is not None:
+                info['rows'] = len(chunk)
+        if chunk is None:
+            return
+        yield chunk
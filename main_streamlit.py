@@ -1,112 +1,54 @@
+import time
+_import_started = time.perf_counter()
+
 import pandas as pd 
 import numpy as np 
-import matplotlib.pyplot as plt 
-import seaborn as sns
 
 from datetime import date
 from datetime import datetime
 
 import streamlit as st
 import os
+from concurrent.futures import ThreadPoolExecutor
 import io
 from io import BytesIO, StringIO
 from typing import Union
 
-#global year_chosen
-
-
-def clean_and_prepare_data (netflix_vh):
-    netflix_vh = netflix_vh.dropna()
-    netflix_hist = netflix_vh.copy()
-
-    netflix_hist.loc[:,'Date'] = pd.to_datetime( netflix_vh.loc[:,'Date'] )
-    first_day = min(netflix_hist['Date'])
-    last_day = max(netflix_hist['Date'])
-
-    netflix_hist.set_index('Title', inplace=True)
-    netflix_hist.loc[:,"is_TV_show"] = False
-    
-    for lab, row  in netflix_hist.iterrows():
-        title = str(lab)
-        is_TVshow = ['Temporada' in title, 'Season' in title, 'Serie' in title, 'Miniserie' in title, 'Capítulo' in title, 'Episode' in title, 'Parte' in title, 'Spartacus: Sangre y Arena​:' in title]    
-        netflix_hist.loc[lab, "is_TV_show"] = max(is_TVshow)
- 
-    return netflix_hist, first_day, last_day
-
-
-def TV_shows_ranking_plot(netflix_hist):
-    TV_shows = netflix_hist[ netflix_hist["is_TV_show"] == True ]
-    TV_shows = TV_shows.reset_index()
-    TV_shows["TV_show"] = TV_shows["Title"].str.split(':',expand=True)[0]
-
-    TV_show_unique = TV_shows["TV_show"].unique()
-
-    TVshow_groupby = TV_shows.groupby(by='TV_show').agg(['sum','count'])
-
-    TVshow_groupby = TVshow_groupby["duration"]
-
-    TVshow_groupby = TVshow_groupby.sort_values('sum', ascending=False) 
-    TVshow_groupby['duration_hours'] = TVshow_groupby['sum']/60
-
-    most_watched = TVshow_groupby.head(10)
+from cache import content_key, results
+from durations import load_catalog
+from sessions import BINGE_EPISODES, binge_report
+from charts import CHARTS, MONTH_NAMES, WEEKDAY_NAMES, estimate_chart, profiles_chart
+from preview import PREVIEW_MIN_BYTES, estimate_history, sample_history
+from household import household_aggregates, household_history, prepare_profiles, profile_names, profile_periods, profile_top_shows, profile_totals
+from plotting import distribution_quarter_year, plot_day, plot_monthly_distribution, plot_most_watched, plot_overall_distribution, plot_weekday_distribution, plot_year_month, plot_year_quarter
+from render import render_figures
+import warmup
+from instrument import Recorder, configure_logging, stage
+from store import MIN_PASSPHRASE_LENGTH, ProfileStore, new_passphrase, profile_path
+from pipeline import TV_shows_ranking_plot, add_duration, clean_and_prepare_data, prepare_history, year_growth
+from aggregation import busiest_month, fill_quarter_info, fill_year_month, total_duration, year_month, year_quarter
+
+# matplotlib and seaborn are imported by the plot functions, which mostly run in the render workers
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
-    return most_watched
-
-
-def plot_most_watched (most_watched):
-
-    st.write("""
-    ## Top 10 TV shows most watched
-
-    These are the TOP 10 TV shows you have most watched. 
-    """)
-    
-    st.dataframe(most_watched[['count','duration_hours']].rename(columns={'count': 'Number of episodes', 'duration_hours' : 'Duration in hours' }))
-
-    fig, ax = plt.subplots(1,1, figsize=(12,4))
-    plt.barh(most_watched.index, most_watched['duration_hours'])
-    plt.xlabel('Watched hours')
-
-    return fig
-
-
-def add_duration(netflix_hist, TV_show_duration, film_duration):
-    netflix_hist.loc[ netflix_hist['is_TV_show'] == True, "duration"] = TV_show_duration
-    netflix_hist.loc[ netflix_hist['is_TV_show'] == False, "duration"] = film_duration
+#global year_chosen
 
-    return netflix_hist
+CHART_BACKENDS = ['Interactive charts', 'Static images']
+# Chosen in the sidebar on every run of the page
+chart_backend = CHART_BACKENDS[0]
 
 
-def summary (netflix_hist, first_day, last_day):
+def summary (cube, first_day, last_day):
+    duration = total_duration(cube)
     st.write("## Overall Analysis")
     st.write(" Since the first day with a log in " + str(first_day.day) + '/' + str(first_day.month) + '/' + str(first_day.year) + ' until the last day with a log in ' + str(last_day.day) + '/' + str(last_day.month) + '/' + str(last_day.year) + '...' )
-    st.write("  *  You have watched {:.0f} hours ".format(netflix_hist["duration"].sum()/60))
-    st.write("  *  {:.0f} hours correspond to {:.0f} of days ".format(netflix_hist["duration"].sum()/60, netflix_hist["duration"].sum()/60/24))
-    st.write("  *  And {:.0f} days to {:.2f} months".format(netflix_hist["duration"].sum()/60/24, netflix_hist["duration"].sum()/60/24/30))
-
-
-def plot_year_month(netflix_hist, first_day, last_day):
-    netflix_hist["month"] = netflix_hist["Date"].dt.month
-    netflix_hist["year"] = netflix_hist["Date"].dt.year
-    netflix_hist["weekday"] = netflix_hist["Date"].dt.weekday
-    month_year_groupby = netflix_hist.groupby(by=['month','year']).sum()
-
-    month_year_groupby['duration_hours'] = month_year_groupby['duration'] / 60
+    st.write("  *  You have watched {:.0f} hours ".format(duration/60))
+    st.write("  *  {:.0f} hours correspond to {:.0f} of days ".format(duration/60, duration/60/24))
+    st.write("  *  And {:.0f} days to {:.2f} months".format(duration/60/24, duration/60/24/30))
 
-    month_year_groupby = month_year_groupby.reset_index(level=['month','year'])
 
-    first_year = first_day.year
-    last_year = last_day.year
-    years = np.arange(first_year, last_day.year + 1)
-
-    for year in years:
-        for month in np.arange(1,13):
-            months_list = list(month_year_groupby.loc[month_year_groupby["year"]==year]["month"])
-            bool_m = month in months_list
-            if bool_m == False:
-                month_year_groupby = month_year_groupby.append( {"month":int(month), "year":int(year), "is_TV_show":0, "duration":0, "duration_hours":0}, ignore_index = True)
-
-    month_year_groupby["year"] = month_year_groupby["year"].astype("int")
+def year_month_info(cube, first_day, last_day):
+    month_year_groupby = fill_year_month(year_month(cube), first_day, last_day)
 
     month_names = pd.DataFrame([[1,"Jan"],[2,"Feb"],[3,"Mar"],[4,"Apr"],[5,"May"],[6,"Jun"],[7,"Jul"],[8,"Aug"],[9,"Sep"],[10,"Oct"],[11,"Nov"],[12,"Dec"]], columns=['month','month_name'])
 
@@ -115,218 +57,20 @@ def plot_year_month(netflix_hist, first_day, last_day):
 
     month_year_groupby = month_year_groupby.sort_values(['year','month'])
 
-    fig, ax = plt.subplots(figsize=(18,6))
-    _ = sns.barplot(x='month-year', y='duration_hours', ax = ax, hue='year', data=month_year_groupby, dodge=False)
-
-    change_width(_, .87)
-
-    plt.xticks(rotation='vertical')
-    plt.ylabel('Watched hours')
-    plt.title('Distribution of watched hours across months')
-    plt.xlabel('')
-    
-    return fig, month_year_groupby
-
-
-def fill_quarter_info (quarter_year_info, first_day, last_day):
-
-    quarter_names = {1:"Q1", 2:"Q2", 3:"Q3", 4:"Q4"}
-
-    first_year = first_day.year
-    last_year = last_day.year
-    years = np.arange(first_year, last_day.year + 1)
-
-    for year in years:
-        for quarter in np.arange(1,5):
-            quarters_list = list(quarter_year_info.loc[quarter_year_info["year"]==year]["quarter_id"])
-            bool_m = quarter in quarters_list
-            if bool_m == False:
-                quarter_year_info = quarter_year_info.append( {"quarter_id":int(quarter), "year":int(year), "duration":0, "duration_hours":0}, ignore_index = True)
-
-    quarter_year_info["quarter"] = quarter_year_info["quarter_id"].replace(quarter_names)
-    quarter_year_info = quarter_year_info.reset_index()
-    quarter_year_info['quarter-year'] = ["{}-{}".format(m, y) for m, y in zip(quarter_year_info['quarter'], quarter_year_info['year'])]
-    quarter_year_info = quarter_year_info.set_index('quarter-year')
-
-    quarter_year_info = quarter_year_info.sort_values(['year','quarter_id'])
-
-    return quarter_year_info
-
-
-def plot_year_quarter(netflix_hist, first_day, last_day):
-    netflix_hist["month"] = netflix_hist["Date"].dt.month
-    netflix_hist["year"] = netflix_hist["Date"].dt.year
-    month_year_groupby = netflix_hist.groupby(by=['month','year']).sum()
-
-    month_year_groupby['duration_hours'] = month_year_groupby['duration'] / 60
-
-    month_year_groupby = month_year_groupby.reset_index(level=['month','year'])
-
-    for year in month_year_groupby["year"].unique():
-        for month in np.arange(1,13):
-            months_list = list(month_year_groupby.loc[month_year_groupby["year"]==year]["month"])
-            bool_m = month in months_list
-            if bool_m == False:
-                month_year_groupby = month_year_groupby.append( {"month":int(month), "year":int(year), "is_TV_show":0, "duration":0, "duration_hours":0}, ignore_index = True)
-
-    month_year_groupby["year"] = month_year_groupby["year"].astype("int")
-
-    quarter_names = pd.DataFrame([[1,"Q1"],[2,"Q1"],[3,"Q1"],[4,"Q2"],[5,"Q2"],[6,"Q2"],[7,"Q3"],[8,"Q3"],[9,"Q3"],[10,"Q4"],[11,"Q4"],[12,"Q4"]], columns=['month','quarter'])
-
-    quarter_year_groupby = pd.merge(month_year_groupby, quarter_names, on='month')
-
-    quarter_year_groupby = quarter_year_groupby.groupby(by = ['year','quarter']).sum()
-
-    quarter_year_groupby = quarter_year_groupby.reset_index()
-
-    quarter_year_groupby['quarter-year'] = ["{}-{}".format(m, y) for m, y in zip(quarter_year_groupby['quarter'], quarter_year_groupby['year'])]
-
-    quarter_year_groupby = quarter_year_groupby.sort_values(['year','quarter'])
-
-    fig, ax = plt.subplots(figsize=(18,6))
-    _ = sns.barplot(x='quarter-year', y='duration_hours', ax = ax, hue='year', data=quarter_year_groupby, dodge=False)
-
-    change_width(_, .87)
-
-    plt.xticks(rotation='vertical')
-    plt.ylabel('Watched hours')
-    plt.title('Distribution of watched hours across quarters of the year')
-    plt.xlabel('')
-    
-    return fig, quarter_year_groupby
-
+    return month_year_groupby
 
-def distribution_quarter_year(netflix_hist, quarter_year_groupby):
-    quarter_code = pd.DataFrame([[1,1],[2,1],[3,1],[4,2],[5,2],[6,2],[7,3],[8,3],[9,3],[10,4],[11,4],[12,4]], columns=['month','quarter_id'])
-    netflix_hist_ = netflix_hist.reset_index()
-    netflix_hist_ = pd.merge(netflix_hist_, quarter_code, on='month')
-    netflix_hist_ = netflix_hist_.set_index('Title')
 
-    quarter_year_type_groupby = netflix_hist_.groupby(by=['year','quarter_id','is_TV_show']).sum()
-    quarter_year_type_groupby['duration_hours'] = quarter_year_type_groupby['duration'] / 60
-    quarter_year_type_groupby = quarter_year_type_groupby.reset_index()
+def year_quarter_info(cube, first_day, last_day):
+    quarter_year_groupby = year_quarter(cube).rename(columns={'quarter': 'quarter_id'})
+    quarter_year_groupby = fill_quarter_info(quarter_year_groupby[['year','quarter_id','duration','duration_hours']], first_day, last_day)
 
+    return quarter_year_groupby.reset_index()
 
-    quarter_year_TV_show = quarter_year_type_groupby[ quarter_year_type_groupby["is_TV_show"] == True]
-    quarter_year_film = quarter_year_type_groupby[ quarter_year_type_groupby["is_TV_show"] == False]
 
-    quarter_year_TV_show = fill_quarter_info (quarter_year_TV_show[['year','quarter_id','duration','duration_hours']], first_day, last_day)
-    quarter_year_film  = fill_quarter_info (quarter_year_film[['year','quarter_id','duration','duration_hours']], first_day, last_day)
-
-    quarter_year_groupby = quarter_year_groupby.set_index('quarter-year')
-
-    fig, ax = plt.subplots(figsize=(6,4))
-    ax.plot(quarter_year_groupby.index, quarter_year_groupby["duration_hours"], label='Total')
-    ax.plot(quarter_year_groupby.index, quarter_year_TV_show["duration_hours"], label='TV shows')
-    ax.plot(quarter_year_groupby.index, quarter_year_film["duration_hours"], label='Films')
-
-    plt.legend()
-    plt.xticks(quarter_year_groupby.index, rotation='vertical')
-    plt.ylabel('Watched hours')
-    #plt.xlabel('Year')
-    plt.title('Distribution between TV shows and films during the years')
-
-    return fig
-
-
-def year_evolution (netflix_hist):
+def year_evolution (cube):
     st.write('This has been the evolution of your consumption over the years:')
 
-    netflix_hist["year"] = netflix_hist["Date"].dt.year
-    year_groupby = netflix_hist.groupby(by=['year']).sum()
-
-    year_groupby_ = pd.DataFrame(year_groupby[['duration']], columns = ['duration'], index = year_groupby.index )
-    year_groupby_['duration [hours]'] = year_groupby['duration']/60
-    year_groupby_["prev_duration"] = year_groupby_['duration [hours]'].shift(1)
-    year_groupby_ = year_groupby_.replace(np.nan, 0)
-
-    year_groupby_['growth [%]'] = (year_groupby_['duration [hours]'] - year_groupby_['prev_duration']) / year_groupby_['prev_duration'] * 100 
-    year_groupby_ = year_groupby_.replace(np.inf, 0)
-
-    st.dataframe(year_groupby_[['duration [hours]','growth [%]']])
-
-
-def plot_overall_distribution(netflix_hist):
-    TV_show_vs_films = netflix_hist.groupby("is_TV_show").sum()
-    TV_show_vs_films = TV_show_vs_films["duration"]
-    TV_show_vs_films = TV_show_vs_films.sort_values(ascending=False)
-    size_TV_show_vs_films = TV_show_vs_films / TV_show_vs_films.sum()
-
-    count_TV_show_vs_films = netflix_hist["is_TV_show"].value_counts()
-
-    labels = ["TV shows", "Films & Documentaries"]
-
-    fig, ax = plt.subplots(1,1, figsize=(8,4))
-
-    # Pie
-    ax.pie(size_TV_show_vs_films, labels=labels, autopct='%1.1f%%',
-            shadow=False, startangle=180)
-    ax.axis('equal')
-   
-    ax.set_title('Overall distribution')
-
-    return fig
-
-
-def plot_monthly_distribution (netflix_hist, first_day, last_day):
-    month_years_pt = month_year_groupby.pivot_table( values="duration_hours", index = "month_name",                                                                                     columns = "year", aggfunc = sum, fill_value = 0)
-    month_years_pt['acumulated'] = 0
-
-    month_years_pt = month_years_pt.loc[["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]]
-
-    first_year, last_year = first_day.year, last_day.year
-    years = np.arange(first_year, last_day.year + 1)
-
-    fig, ax = plt.subplots(figsize=(12,8))
-    
-    for year in years:
-        ax.plot( month_years_pt.index, month_years_pt[year], label= str(year), linewidth = 3)
-    
-    # Stacked
-    #for year in years:
-    #    ax.bar( month_years_pt.index, month_years_pt[year], label= str(year), bottom = month_years_pt['acumulated'])
-    #    month_years_pt['acumulated'] = month_years_pt['acumulated'] + month_years_pt[year]
-
-    ax.set_xticklabels( month_years_pt.index) 
-    ax.set_ylabel("Watched hours")
-    plt.title('Distribution of monthly watched hours during the years')
-    ax.legend()
-    
-    return fig
-
-
-def fill_weekdays(weekday_df):
-    for i in range(0,7):
-        bool_w = i in list(weekday_df['weekday'])
-        if bool_w == False:
-            weekday_df = weekday_df.append({'weekday': i,'duration':0}, ignore_index = True)
-    return weekday_df
-
-
-def plot_weekday_distribution (netflix_hist):
-
-    netflix_hist["weekday"] = netflix_hist["Date"].dt.weekday
-    weekday_value_counts = netflix_hist["weekday"].value_counts()
-    weekday_groupby = netflix_hist.groupby(by=['weekday','is_TV_show']).sum()
-
-    weekday_groupby = weekday_groupby.reset_index()
-
-    weekday_TV_shows = weekday_groupby[weekday_groupby["is_TV_show"] == True]
-    weekday_films = weekday_groupby[weekday_groupby["is_TV_show"] == False]
-    weekday_TV_shows = fill_weekdays(weekday_TV_shows[['weekday','duration']])
-    weekday_films = fill_weekdays(weekday_films[['weekday','duration']])
-
-    weekday_names =["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
-
-    fig, ax = plt.subplots(figsize=(8,4))
-
-    ax.bar( weekday_names, weekday_TV_shows["duration"], label="TV shows" )
-    ax.bar( weekday_names, weekday_films["duration"], bottom = weekday_TV_shows["duration"], label = "Films" )
-    ax.set_ylabel("Watched hours")
-    plt.title('Distribution of watched hours during the each day of the week')
-    ax.legend()
-
-    return fig
+    st.dataframe(year_growth(cube))
 
 
 st.write("""
@@ -387,176 +131,461 @@ class FileUpload(object):
             show_file.info("Please upload a file of type: " + ", ".join(["csv"]))
             return 0, found
 
-        content = file.getvalue()
-        data = pd.read_csv(file)
         found = True
-        #st.dataframe(data.head(10))
-        file.close()
-        return data, found
-
-
-def change_width(ax, new_value) :
-    for patch in ax.patches :
-        current_width = patch.get_width()
-        diff = current_width - new_value
-        # we change the bar width
-        patch.set_width(new_value)
-        # we recenter the bar
-        patch.set_x(patch.get_x() + diff * .5)
-
-
-def plot_day (netflix_hist, month_chosen, year_chosen):
-    netflix_hist['day'] = netflix_hist['Date'].dt.day
-    netflix_hist['month'] = netflix_hist['Date'].dt.month
-    netflix_hist['year'] = netflix_hist['Date'].dt.year
-
-    months_duration = {1:31, 2:29, 3:31, 4:30, 5:31, 6:30, 7:31, 8:31, 9:30, 10:31, 11:30, 12:31}
-    month_names = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
-
-    st.write('### Daily Viewing Activity in the most watched month: ' + month_names[month_chosen] + ' ,' + str(year_chosen) )
-
-    month_dt = netflix_hist[ (netflix_hist['year'] == year_chosen) & (netflix_hist['month'] == month_chosen) ]
-    day_groupby = month_dt.groupby('day').sum()
-    day_groupby = day_groupby['duration']/60
-
-    months_duration = months_duration[2]
-    day_groupby = day_groupby.reset_index()
-
-    for day in np.arange(1,months_duration+1):
-            day_list = list(day_groupby["day"])
-            bool_d = day in day_list
-            if bool_d == False:
-                day_groupby = day_groupby.append( {"day":int(day), "duration":0}, ignore_index = True)
-
-    day_groupby = day_groupby.sort_values(by='day')
-
-    fig, ax = plt.subplots(figsize=(12,4))
-    _ = sns.barplot(x='day', y='duration', ax = ax, data=day_groupby, dodge=False)
-    change_width(_, .87)
-
-    plt.xticks(rotation='vertical')
-    plt.ylabel('Watched hours')
-    #plt.title('Distribution of watched hours each day in '+ month_names[month_chosen] + ', ' + str(year_chosen))
-    plt.xlabel('')
-
-    st.pyplot(fig)
+        return file, found
 
+    def run_many(self):
+        """
+        Upload several files (household mode)
+        :return: list of files, whether any was uploaded
+        """
+        st.markdown(STYLE, unsafe_allow_html=True)
+        files = st.file_uploader("Upload one file per profile", type=self.fileTypes, accept_multiple_files=True)
+        if not files:
+            st.empty().info("Please upload files of type: " + ", ".join(["csv"]))
+            return [], False
+
+        return files, True
+
+
+def upload_keys(file, TV_show_duration, film_duration, profile=None):
+    """
+    Key of the result of an upload and key of its prepared history. With a
+    profile, the result key also holds the revision of the store, so a result
+    is not reused once another upload has updated the profile.
+    """
+    revision = ProfileStore(profile).revision() if profile else None
+    # Hash the upload through a view of its buffer rather than a copy
+    with file.getbuffer() as content:
+        catalog_key = load_catalog().key
+        key = content_key(content, TV_show_duration, film_duration, catalog_key, profile, revision)
+        history_key = content_key(content, TV_show_duration, film_duration, catalog_key)
+
+    return key, history_key
+
+
+def upload_size(file):
+    with file.getbuffer() as content:
+        return content.nbytes
+
+
+def analyse(file, TV_show_duration, film_duration, recorder=None, profile=None, keys=None):
+    """
+    Clean the uploaded history and compute its aggregates, reusing the result
+    of a previous run on the same bytes and durations. With a profile, the
+    upload is merged into the stored profile and only its new rows are processed.
+    :param profile: path of the profile store (see store.profile_path)
+    :param keys: upload_keys of the file, when already computed
+    :return: dict with the history (None for a profile), its aggregates and the rendered figures
+    """
+    with stage(recorder, 'hash upload'):
+        key, history_key = keys or upload_keys(file, TV_show_duration, film_duration, profile)
+        result = results.get(key)
+    if recorder is not None:
+        recorder.run_id = key
+    if result is not None:
+        return result
+
+    if profile:
+        with stage(recorder, 'update profile') as info:
+            stored, info['rows'] = ProfileStore(profile).update(file, TV_show_duration, film_duration)
+        if stored is None:
+            raise ValueError("The file does not contain any viewing activity")
+        netflix_hist = None
+        cube, show_index, first_day, last_day = stored['cube'], stored['show_index'], stored['first_day'], stored['last_day']
+    else:
+        netflix_hist, cube, show_index, first_day, last_day = prepare_history(file, history_key, TV_show_duration, film_duration, recorder)
+
+    # The aggregates of every section are computed when it is opened (see section_data)
+    result = {'key': key, 'profile': profile, 'netflix_hist': netflix_hist, 'first_day': first_day, 'last_day': last_day,
+              'cube': cube, 'show_index': show_index, 'sections': {}, 'charts': {}, 'figures': {}}
+
+    return results.put(key, result)
+
+
+def analyse_with_preview(file, TV_show_duration, film_duration, recorder=None, profile=None, keys=None):
+    """
+    analyse in a background thread while an estimate of the main results,
+    from a sample of the upload (see preview.py), is shown. The estimate is
+    removed once the exact result is ready.
+    """
+    # Each thread records its stages on its own recorder, merged afterwards.
+    # tracemalloc is process wide, so these overlapping stages do not trace memory.
+    background, foreground = (None, None) if recorder is None else (Recorder(), Recorder())
+
+    placeholders = [st.empty() for _ in range(4)]
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(analyse, file, TV_show_duration, film_duration, background, profile, keys)
+
+        with stage(foreground, 'preview') as info:
+            with file.getbuffer() as content:
+                sample, n_rows = sample_history(content)
+            netflix_hist, _, _ = clean_and_prepare_data(sample)
+            estimates = estimate_history(add_duration(netflix_hist, TV_show_duration, film_duration), n_rows)
+            info['rows'] = estimates['sample']
+        show_preview(placeholders, estimates)
+
+        result = future.result()
+
+    if recorder is not None:
+        recorder.merge(background)
+        recorder.merge(foreground)
+        recorder.run_id = background.run_id
+
+    for placeholder in placeholders:
+        placeholder.empty()
+    return result
+
+
+def show_preview(placeholders, estimates):
+    hours, bound = estimates['hours'], estimates['hours_bound']
+    placeholders[0].info("Preview estimated from {:,} of your {:,} rows, with 95% bounds: "
+                         "the exact analysis is being computed.".format(estimates['sample'], estimates['rows']))
+    placeholders[1].write("## Overall Analysis (preview)\n"
+                          "  *  You have watched about {:.0f} hours (± {:.0f})\n"
+                          "  *  {:.0f} hours correspond to about {:.0f} days (± {:.0f})".format(hours, bound, hours, hours / 24, bound / 24))
+    placeholders[2].altair_chart(estimate_chart(estimates['months']), use_container_width=True)
+    top_shows = estimates['top_shows'].round(0)
+    placeholders[3].dataframe(top_shows[['episodes', 'hours', 'low', 'high']].rename(
+        columns={'episodes': 'Number of episodes (est.)', 'hours': 'Duration in hours (est.)', 'low': 'From', 'high': 'To'}))
+
+
+def analyse_household(files, TV_show_duration, film_duration, recorder=None):
+    """
+    Household mode: the exports of several profiles, prepared in parallel and
+    aggregated together with the profile as an extra key (see household.py).
+    The histories are prepared under the same keys as in analyse, so both
+    modes share the columnar cache.
+    :return: dict like analyse, with the profiles and the cube and show index keyed by profile
+    """
+    with stage(recorder, 'hash upload'):
+        catalog_key = load_catalog().key
+        names = profile_names([file.name for file in files])
+        contents = [file.getvalue() for file in files]
+        history_keys = [content_key(content, TV_show_duration, film_duration, catalog_key) for content in contents]
+        key = content_key('\n'.join(history_keys + names).encode('utf-8'), 'household')
+        result = results.get(key)
+    if recorder is not None:
+        recorder.run_id = key
+    if result is not None:
+        return result
+
+    with stage(recorder, 'prepare profiles', len(contents)):
+        prepared = prepare_profiles(contents, history_keys, TV_show_duration, film_duration)
+    with stage(recorder, 'household_history') as info:
+        netflix_hist = household_history([history for history, _, _ in prepared], names)
+        info['rows'] = len(netflix_hist)
+    with stage(recorder, 'household_aggregates', len(netflix_hist)):
+        cube, show_index = household_aggregates(netflix_hist)
+
+    result = {'key': key, 'profile': None, 'profiles': names, 'netflix_hist': netflix_hist,
+              'first_day': min(first_day for _, first_day, _ in prepared),
+              'last_day': max(last_day for _, _, last_day in prepared),
+              'cube': cube, 'show_index': show_index, 'sections': {}, 'charts': {}, 'figures': {}}
+
+    return results.put(key, result)
+
+
+def section(title, expanded=False):
+    """
+    Checkbox opening a section of the report. Nothing below it runs while it
+    is closed, so its aggregates and figures are only computed once opened.
+    """
+    return st.checkbox(title, value=expanded)
+
+
+def section_data(result, name, function, *args, recorder=None):
+    """
+    Aggregate of a section, computed the first time the section is opened
+    and then kept in the cached result
+    """
+    sections = result['sections']
+    if name not in sections:
+        with stage(recorder, function.__name__):
+            sections[name] = function(*args)
+
+    return sections[name]
+
+
+def history_of(result):
+    """
+    The cleaned history of a result, read back from the store for a profile
+    """
+    if result['netflix_hist'] is None:
+        return ProfileStore(result['profile']).load_history()
+    return result['netflix_hist']
+
+
+def result_binges(result):
+    return binge_report(history_of(result))
+
+
+def profiles_side_by_side(result, recorder=None):
+    """
+    Household mode: totals, periods and top TV shows of every profile
+    """
+    cube = result['cube']
+    st.write('## Profiles side by side')
+
+    totals = section_data(result, 'profile_totals', profile_totals, cube, recorder=recorder)
+    st.dataframe(totals.rename(columns={'duration_hours': 'Watched hours', 'count': 'Titles watched',
+                                        'TV_show_share': 'TV shows [%]'}))
+
+    months = section_data(result, 'profile_months', profile_periods, cube, ['year', 'month'], recorder=recorder)
+    months = pd.DataFrame(months.values, columns=months.columns,
+                          index=['{}-{}'.format(MONTH_NAMES[month - 1], year) for year, month in months.index])
+    st.altair_chart(profiles_chart(months, 'Watched hours across months'), use_container_width=True)
+
+    weekdays = section_data(result, 'profile_weekdays', profile_periods, cube, ['weekday'], recorder=recorder)
+    weekdays = pd.DataFrame(weekdays.values, columns=weekdays.columns,
+                            index=[WEEKDAY_NAMES[weekday] for weekday in weekdays.index])
+    st.altair_chart(profiles_chart(weekdays, 'Watched hours during each day of the week'), use_container_width=True)
+
+    st.write('### Top 10 TV shows of every profile')
+    most_watched = section_data(result, 'profile_top_shows', profile_top_shows, result['show_index'], recorder=recorder)
+    st.dataframe(most_watched[['count', 'duration_hours']].rename(columns={'count': 'Number of episodes', 'duration_hours': 'Duration in hours'}))
+
+
+def binge_watching(binges, n=10):
+    """
+    Longest streaks and biggest binges of the TV shows (see sessions.py)
+    """
+    st.write("""
+    ## Binge-watching
+
+    A sitting gathers the episodes of a TV show watched the same day and a binge is a sitting of at least {} episodes.
+    """.format(BINGE_EPISODES))
+    if len(binges) == 0:
+        st.write("There are no TV shows in your history.")
+        return
+
+    biggest = binges['biggest_binge'].idxmax()
+    longest = binges['longest_streak'].idxmax()
+    st.write("Your biggest binge was **{} episodes of {}** on {}, and your longest streak **{} days in a row of {}** (from {} to {}). "
+             "On average you watch **{:.1f} episodes per sitting**.".format(
+                 binges.loc[biggest, 'biggest_binge'], biggest, binges.loc[biggest, 'biggest_binge_day'].strftime('%d/%m/%Y'),
+                 binges.loc[longest, 'longest_streak'], longest, binges.loc[longest, 'streak_first_day'].strftime('%d/%m/%Y'),
+                 binges.loc[longest, 'streak_last_day'].strftime('%d/%m/%Y'),
+                 binges['episodes'].sum() / binges['sittings'].sum()))
+
+    top = binges.nlargest(n, ['longest_streak', 'biggest_binge'])
+    st.dataframe(top[['longest_streak', 'binges', 'biggest_binge', 'episodes_per_sitting']].rename(
+        columns={'longest_streak': 'Longest streak (days)', 'binges': 'Binges', 'biggest_binge': 'Biggest binge (episodes)',
+                 'episodes_per_sitting': 'Episodes per sitting'}))
+
+
+def show_figure(pending, result, name, plot_function, *args):
+    """
+    Show a cached figure, or keep a placeholder for it on the page and queue
+    it in pending so that render_pending builds it with the others. With
+    interactive charts, the Vega-Lite version of the figure (see charts.py)
+    is sent to the browser instead and nothing is rendered on the server.
+    """
+    if chart_backend == CHART_BACKENDS[0] and plot_function.__name__ in CHARTS:
+        if name not in result['charts']:
+            result['charts'][name] = CHARTS[plot_function.__name__](*args)
+        st.altair_chart(result['charts'][name], use_container_width=True)
+        return
+
+    placeholder = st.empty()
+    if name in result['figures']:
+        placeholder.image(result['figures'][name])
+    else:
+        pending.append((name, placeholder, plot_function.__name__, args))
+
+
+def render_pending(pending, result, recorder=None):
+    """
+    Render the queued figures in parallel and fill each placeholder as soon as
+    its figure is ready
+    """
+    if not pending:
+        return
+
+    placeholders = {name: placeholder for name, placeholder, _, _ in pending}
+    function_names = {name: function_name for name, _, function_name, _ in pending}
+    tasks = [(name, function_name, args) for name, _, function_name, args in pending]
+    with stage(recorder, 'render figures', len(tasks)):
+        for name, png, elapsed in render_figures(tasks):
+            result['figures'][name] = png
+            placeholders[name].image(png)
+            if recorder is not None:
+                # Time spent in the worker that built the figure
+                recorder.add(function_names[name], elapsed)
+
+
+def debug_panel(recorder):
+    st.write('## Performance')
+    st.write('Time, rows and memory of every stage of this run (figures are timed in the worker that rendered them).')
+    st.dataframe(pd.DataFrame(recorder.records()).set_index('stage'))
+
+
+def profile_passphrase():
+    """
+    Sidebar input of the secret passphrase of a stored profile, with a button
+    creating a new one that is shown only once
+    :return: path of the profile store, or None without a profile
+    """
+    if st.sidebar.button('Create a profile passphrase'):
+        st.sidebar.info("Your new passphrase, shown only this once: keep it to load your profile again")
+        st.sidebar.code(new_passphrase())
+    passphrase = st.sidebar.text_input('Profile passphrase (optional): keeps your history so that next uploads only process new rows',
+                                       type='password').strip()
+    if not passphrase:
+        return None
+    if len(passphrase) < MIN_PASSPHRASE_LENGTH:
+        st.sidebar.warning("The passphrase needs at least {} characters".format(MIN_PASSPHRASE_LENGTH))
+        return None
+    return profile_path(passphrase)
+
+
+def day_activity_note():
     st.write(""" It is important to mention that as in the csv file only appears the Title and Date. Moreover, it is considered that every film or episode has been watched completely during that day.     
     And one last point to be considered is that you can watch Netflix on several plarforms so you could be watching a film and simultaneouly a relative could be watching another film. 
     These two assumptions can lead to days on unreasonable number of hours watched during that day (more than 24 hours registered in a day).  """)
 
 
-def year_buttons(first_day, last_day):
-    first_year = first_day.year
-    last_year = last_day.year
-    delta = last_year - first_year + 1
-    years = np.arange(first_year, last_year+1)
-
-    year_chosen = first_year 
-
-    st.write('Select a year from the list:')
-
-    years_buttons = []
-    if delta == 1:
-        year1 = st.beta_columns([0.1])
-        years_buttons.append(year1)
-    if delta == 2:
-        year1, year2 = st.beta_columns([0.1, 0.1])
-        years_buttons.append(year1); years_buttons.append(year2)
-    if delta == 3:
-        year1, year2, year3 = st.beta_columns([0.1, 0.1, 0.1])
-        years_buttons.append(year1); years_buttons.append(year2); years_buttons.append(year3)
-    if delta == 4:
-        year1, year2, year3, year4 = st.beta_columns([0.1, 0.1, 0.1, 0.1])
-        years_buttons.append(year1); years_buttons.append(year2); years_buttons.append(year3); years_buttons.append(year4)
-    if delta == 5:
-        year1, year2, year3, year4, year5 = st.beta_columns([0.1, 0.1, 0.1, 0.1, 0.1])
-        years_buttons.append(year1); years_buttons.append(year2); years_buttons.append(year3); years_buttons.append(year4); years_buttons.append(year5)
-    if delta == 6:
-        year1, year2, year3, year4, year5, year6 = st.beta_columns([0.1, 0.1, 0.1, 0.1, 0.1, 0.1])
-        years_buttons.append(year1); years_buttons.append(year2); years_buttons.append(year3); years_buttons.append(year4); years_buttons.append(year5); years_buttons.append(year6)
-    
-    i = 0
-    for x in years_buttons:
-        if x.button(str(years[i])):
-            #st.write('You selected ' + str(years[i]))
-            year_chosen = years[i]
-        i += 1
-
-
-def month_buttons(netflix_hist):
-    st.write('Select a month from the list:')
-
-    month_names = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
-    month_buttons = []
-
-    month1, month2, month3, month4, month5, month6, month7, month8, month9, month10, month11, month12 = st.beta_columns([0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1])
-    month_buttons.append(month1); month_buttons.append(month2); month_buttons.append(month3); month_buttons.append(month4); month_buttons.append(month5); month_buttons.append(month6)
-    month_buttons.append(month7); month_buttons.append(month8); month_buttons.append(month9); month_buttons.append(month10); month_buttons.append(month11); month_buttons.append(month12)
-
-    i = 0
-    for x in month_buttons:
-        if x.button(month_names[i]):
-            st.write('Displaying ' + month_names[i] + ', ' + str(year_chosen))
-            month_chosen = i
-            plot_day (netflix_hist, month_chosen, year_chosen)
-            #Action
-        i += 1
+def month_picker(result, busiest):
+    """
+    Year and month selectors of the daily activity, opened on the busiest
+    month. Their values are kept by Streamlit in the widget state of the
+    session, one pair per upload, not with the cached result that every
+    session shares.
+    :return: chosen month (1-12), chosen year
+    """
+    first_day, last_day = result['first_day'], result['last_day']
+    years = list(range(first_day.year, last_day.year + 1))
+    busiest_month, busiest_year = busiest
+
+    year_column, month_column = st.beta_columns(2)
+    year_chosen = year_column.selectbox('Year', years, index=years.index(busiest_year),
+                                        key='day-year-' + result['key'])
+    month_chosen = month_column.selectbox('Month', list(range(1, 13)), index=busiest_month - 1,
+                                          format_func=lambda month: MONTH_NAMES[month - 1],
+                                          key='day-month-' + result['key'])
+    return month_chosen, year_chosen
+
+
+def daily_activity(pending, result):
+    """
+    Daily viewing activity of one month, the busiest one until another is
+    picked. Only the slice of the cube of that month is plotted.
+    """
+    cube = result['cube']
+    busiest = busiest_month(cube)
+    month_chosen, year_chosen = month_picker(result, busiest)
+
+    if (month_chosen, year_chosen) == busiest:
+        st.write('### Daily Viewing Activity in the most watched month: ' + MONTH_NAMES[month_chosen - 1] + ' ,' + str(year_chosen) )
+    else:
+        st.write('### Daily Viewing Activity in ' + MONTH_NAMES[month_chosen - 1] + ' ,' + str(year_chosen) )
+    show_figure(pending, result, 'day-{}-{}'.format(year_chosen, month_chosen), plot_day, cube, month_chosen, year_chosen)
+    day_activity_note()
 
 
 if __name__ ==  "__main__":
-    file_upload = FileUpload()
-    netflix_data, found  = file_upload.run() 
+    configure_logging()
+    debug = st.sidebar.checkbox('Show performance debug panel')
+    chart_backend = st.sidebar.radio('Charts', CHART_BACKENDS)
+    household = st.sidebar.checkbox('Household mode: compare the profiles of several files')
+    profile = None if household else profile_passphrase()
+    # Tracing memory is stopped even when the run fails
+    with Recorder(trace_memory=debug) as recorder:
+        # Only the first run of the process pays for the imports
+        recorder.add('imports', IMPORT_SECONDS)
+        warmup.start()
+        if chart_backend == CHART_BACKENDS[1]:
+            warmup.start_pool()
+
+        file_upload = FileUpload()
+        with stage(recorder, 'upload'):
+            if household:
+                files, found = file_upload.run_many()
+            else:
+                file, found  = file_upload.run() 
+
+        if found == True:
+            if household:
+                result = analyse_household(files, 40, 100, recorder)
+            else:
+                keys = upload_keys(file, 40, 100, profile)
+                if keys[0] not in results and upload_size(file) >= PREVIEW_MIN_BYTES:
+                    result = analyse_with_preview(file, 40, 100, recorder, profile, keys)
+                else:
+                    result = analyse(file, 40, 100, recorder, profile, keys)
+            pending = []
+            cube, first_day, last_day = result['cube'], result['first_day'], result['last_day']
+
+            if household and section('Profiles side by side', expanded=True):
+                profiles_side_by_side(result, recorder)
+
+            # Summary
+            with stage(recorder, 'summary'):
+                summary (cube, first_day, last_day)
+
+            with stage(recorder, 'year_evolution'):
+                year_evolution (cube)
+        
+            catalog = load_catalog()
+            if len(catalog):
+                st.write(" The duration of the **{} titles and TV shows of the catalog** is their runtime; for the rest, **TV shows episodes** are considered to last **40 min** and **films** **100 min**.".format(len(catalog)))
+            else:
+                st.write(" The **duration of TV shows episodes** is considered to be **40 min**, whereas for the **films' duration** is **100 min**.")
 
-    if found == True:
-        netflix_hist, first_day, last_day = clean_and_prepare_data (netflix_data)    
-        netflix_hist = add_duration(netflix_hist, 40, 100)
+            if section('Watched hours across months and quarters', expanded=True):
+                month_year_groupby = section_data(result, 'month_year_groupby', year_month_info, cube, first_day, last_day, recorder=recorder)
+                quarter_year_groupby = section_data(result, 'quarter_year_groupby', year_quarter_info, cube, first_day, last_day, recorder=recorder)
 
-        # Summary
-        summary (netflix_hist, first_day, last_day)
+                st.write("The following graph shows the number of watched hours across every month since the first log:")
+                show_figure(pending, result, 'year_month', plot_year_month, month_year_groupby)
 
-        year_evolution (netflix_hist)
-        
-        st.write(" The **duration of TV shows episodes** is considered to be **40 min**, whereas for the **films' duration** is **100 min**.")
-        st.write("The following graph shows the number of watched hours across every month since the first log:")
+                st.write(" The following graph shows the number of watched hours across every trimester or quarter: ")
+                show_figure(pending, result, 'year_quarter', plot_year_quarter, quarter_year_groupby)
 
-        fig, month_year_groupby = plot_year_month(netflix_hist, first_day, last_day)
-        st.pyplot(fig)
+            if section('Daily viewing activity'):
+                daily_activity(pending, result)
 
-        st.write(" The following graph shows the number of watched hours across every trimester or quarter: ")
-        fig, quarter_year_groupby = plot_year_quarter(netflix_hist, first_day, last_day)
-        st.pyplot(fig)
+            if section('Top 10 TV shows most watched'):
+                # Most watched TV shows
+                most_watched_TV_shows = section_data(result, 'most_watched', TV_shows_ranking_plot, result['netflix_hist'], result['show_index'], recorder=recorder)
+                st.write("""
+                ## Top 10 TV shows most watched
 
-        max_duration = month_year_groupby.max()['duration']
+                These are the TOP 10 TV shows you have most watched. 
+                """)
+                st.dataframe(most_watched_TV_shows[['count','duration_hours']].rename(columns={'count': 'Number of episodes', 'duration_hours' : 'Duration in hours' }))
+                show_figure(pending, result, 'most_watched', plot_most_watched, most_watched_TV_shows)
 
-        plot_day (netflix_hist, int(month_year_groupby[ month_year_groupby['duration'] == max_duration ]['month']), int(month_year_groupby[ month_year_groupby['duration'] == max_duration ]['year']))
+            if section('Binge-watching'):
+                binges = section_data(result, 'binges', result_binges, result, recorder=recorder)
+                binge_watching(binges)
 
-        #year_chosen = first_day.year
-        #year_buttons(first_day, last_day)
-        #month_buttons(netflix_hist)
+            if section('Distribution of TV shows and films'):
+                quarter_year_groupby = section_data(result, 'quarter_year_groupby', year_quarter_info, cube, first_day, last_day, recorder=recorder)
 
-        # Most watched TV shows
-        most_watched_TV_shows = TV_shows_ranking_plot(netflix_hist)
-        fig = plot_most_watched (most_watched_TV_shows)
-        st.pyplot(fig)
+                st.write('### Distribution of TV shows and films ')
+                st.write('The following graphs describe how has been the distribution of watched hours. The first one describes the overall distribution and the second one describes this distribution across every trimester or quarter dintinguishing between TV shows and Films. ')
 
-        st.write('### Distribution of TV shows and films ')
-        st.write('The following graphs describe how has been the distribution of watched hours. The first one describes the overall distribution and the second one describes this distribution across every trimester or quarter dintinguishing between TV shows and Films. ')
+                show_figure(pending, result, 'overall_distribution', plot_overall_distribution, cube)
 
-        fig = plot_overall_distribution(netflix_hist)
-        st.pyplot(fig)
+                show_figure(pending, result, 'quarter_year_distribution', distribution_quarter_year, cube, quarter_year_groupby, first_day, last_day)
 
-        fig = distribution_quarter_year(netflix_hist, quarter_year_groupby)
-        st.pyplot(fig)
+            if section('Monthly and weekday distribution'):
+                month_year_groupby = section_data(result, 'month_year_groupby', year_month_info, cube, first_day, last_day, recorder=recorder)
 
-        # Weekly and monthly analysis
-        st.write('## Monthly and weekday distribution')
+                # Weekly and monthly analysis
+                st.write('## Monthly and weekday distribution')
 
-        st.write('The following graph describes the sum number of watched hours for each month during all the years.')
-        fig = plot_monthly_distribution (month_year_groupby, first_day, last_day)
-        st.pyplot(fig)
-        
-        st.write('The following graph describes the sum number of watched hours for day of the week.')
-        fig = plot_weekday_distribution (netflix_hist)
-        st.pyplot(fig)
+                st.write('The following graph describes the sum number of watched hours for each month during all the years.')
+                show_figure(pending, result, 'monthly_distribution', plot_monthly_distribution, month_year_groupby, first_day, last_day)
+
+                st.write('The following graph describes the sum number of watched hours for day of the week.')
+                show_figure(pending, result, 'weekday_distribution', plot_weekday_distribution, cube)
+
+            render_pending(pending, result, recorder)
+            # Account for the sections and figures computed in this run in the memory used by the cache
+            results.put(result['key'], result)
 
+            recorder.emit()
+            if debug:
+                debug_panel(recorder)
@@ -0,0 +1,153 @@
+"""
+Pipeline of the analysis, shared by the app, the batch CLI, the profile
+store and the JSON API: clean and classify a viewing history export, add
+the duration of every row, aggregate it and summarise the aggregates. Nothing here uses Streamlit,
+so it can be imported by worker processes and other services.
+"""
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from aggregation import build_cube, merge_cubes, years
+from classifier import classify_titles
+from columnar import CACHE_DIR, cache_directory, history_from_columns, map_columns, prune_cache, save_columns
+from dates import detect_date_format, from_day_number, parse_dates, to_day_number
+from durations import load_catalog
+from history import concat_histories, make_history
+from ingest import CHUNKSIZE, read_history_chunks
+from instrument import stage, timed_chunks
+from shows import build_show_index, merge_show_indexes, top_shows
+
+
+def clean_and_prepare_data (netflix_vh, date_format=None):
+    netflix_vh = netflix_vh.dropna()
+
+    # Build the compact history straight from the columns instead of copying the raw frame
+    titles = pd.Categorical(netflix_vh['Title'].values)
+    day_numbers = to_day_number(parse_dates( netflix_vh['Date'].values, date_format ))
+    netflix_hist = make_history(day_numbers, titles, classify_titles(titles))
+    first_day, last_day = from_day_number([day_numbers.min(), day_numbers.max()])
+
+    return netflix_hist, first_day, last_day
+
+
+def add_duration(netflix_hist, TV_show_duration, film_duration, catalog=None):
+    """
+    Runtime of every row from the title catalog (see durations.py), with
+    TV_show_duration and film_duration for the titles it does not know
+    """
+    if catalog is None:
+        catalog = load_catalog()
+    netflix_hist["duration"] = catalog.durations(netflix_hist, TV_show_duration, film_duration)
+
+    return netflix_hist
+
+
+def load_history(source, TV_show_duration, film_duration, chunksize=CHUNKSIZE, keep_history=True, recorder=None,
+                 aggregate=True):
+    """
+    Clean, classify and aggregate a viewing history CSV chunk by chunk, so at
+    most one raw chunk is in memory at a time. With keep_history=False only
+    the aggregate cube is kept and memory stays bounded whatever the file size.
+    With aggregate=False only the history is prepared, for callers that
+    aggregate several histories together.
+    :return: history (or None), cube (or None), show index (or None), first day, last day
+    """
+    histories, cubes, show_indexes = [], [], []
+    chunks = 0
+    first_day, last_day = None, None
+    date_format = None
+
+    for chunk in timed_chunks(recorder, 'read csv', read_history_chunks(source, chunksize)):
+        rows = len(chunk)
+        # The format is detected once, so every chunk is read the same way
+        if date_format is None:
+            date_format = detect_date_format(chunk['Date'])
+        with stage(recorder, 'clean_and_prepare_data', rows):
+            netflix_hist, chunk_first_day, chunk_last_day = clean_and_prepare_data(chunk, date_format)
+        with stage(recorder, 'add_duration', rows):
+            netflix_hist = add_duration(netflix_hist, TV_show_duration, film_duration)
+        if aggregate:
+            with stage(recorder, 'build_cube', rows):
+                cubes.append(build_cube(netflix_hist))
+            with stage(recorder, 'build_show_index', rows):
+                show_indexes.append(build_show_index(netflix_hist))
+
+        chunks += 1
+        first_day = chunk_first_day if first_day is None else min(first_day, chunk_first_day)
+        last_day = chunk_last_day if last_day is None else max(last_day, chunk_last_day)
+        if keep_history:
+            histories.append(netflix_hist)
+
+    if chunks == 0:
+        raise ValueError("The file does not contain any viewing activity")
+
+    with stage(recorder, 'merge chunks', chunks):
+        netflix_hist, cube, show_index = None, None, None
+        if keep_history:
+            netflix_hist = concat_histories(histories)
+        if aggregate:
+            cube, show_index = merge_cubes(cubes), merge_show_indexes(show_indexes)
+
+    return netflix_hist, cube, show_index, first_day, last_day
+
+
+def prepare_history(source, key, TV_show_duration, film_duration, recorder=None, cache_dir=CACHE_DIR, aggregate=True):
+    """
+    load_history through the columnar cache on disk: a history that any
+    session or batch job already prepared is memory-mapped back instead of
+    being parsed and classified again
+    :return: history, cube (or None), show index (or None), first day, last day
+    """
+    directory = cache_directory(key, cache_dir)
+    if os.path.isdir(directory):
+        try:
+            with stage(recorder, 'map cached history') as info:
+                columns, titles, meta = map_columns(directory)
+                netflix_hist = history_from_columns(columns, titles)
+                info['rows'] = meta['rows']
+        except (OSError, ValueError, KeyError):
+            # Unreadable cache entry: prepare the history again
+            shutil.rmtree(directory, ignore_errors=True)
+        else:
+            cube, show_index = None, None
+            if aggregate:
+                with stage(recorder, 'build_cube', meta['rows']):
+                    cube = build_cube(netflix_hist)
+                with stage(recorder, 'build_show_index', meta['rows']):
+                    show_index = build_show_index(netflix_hist)
+            first_day, last_day = from_day_number([meta['first_day'], meta['last_day']])
+            return netflix_hist, cube, show_index, first_day, last_day
+
+    netflix_hist, cube, show_index, first_day, last_day = load_history(source, TV_show_duration, film_duration, recorder=recorder,
+                                                                       aggregate=aggregate)
+    with stage(recorder, 'save columns', len(netflix_hist)):
+        save_columns(netflix_hist, directory, first_day=int(to_day_number([first_day])[0]), last_day=int(to_day_number([last_day])[0]))
+        prune_cache(cache_dir)
+
+    return netflix_hist, cube, show_index, first_day, last_day
+
+
+def TV_shows_ranking_plot(netflix_hist, show_index=None, n=10):
+    if show_index is None:
+        show_index = build_show_index(netflix_hist)
+
+    most_watched = top_shows(show_index, n)
+
+    return most_watched
+
+
+def year_growth(cube):
+    year_groupby = years(cube).set_index('year')
+
+    year_groupby_ = pd.DataFrame(year_groupby[['duration']], columns = ['duration'], index = year_groupby.index )
+    year_groupby_['duration [hours]'] = year_groupby['duration']/60
+    year_groupby_["prev_duration"] = year_groupby_['duration [hours]'].shift(1)
+    year_groupby_ = year_groupby_.replace(np.nan, 0)
+
+    year_groupby_['growth [%]'] = (year_groupby_['duration [hours]'] - year_groupby_['prev_duration']) / year_groupby_['prev_duration'] * 100 
+    year_groupby_ = year_groupby_.replace(np.inf, 0)
+
+    return year_groupby_[['duration [hours]','growth [%]']]
@@ -0,0 +1,189 @@
+"""
+Matplotlib versions of the report figures, rendered to PNG by render.py
+(usually in its worker processes). This module has no Streamlit calls, so
+the workers can import it without running the page. matplotlib and seaborn
+are imported by the plot functions themselves, as they take seconds to load.
+"""
+import numpy as np
+
+from aggregation import content_type, fill_month_day, fill_quarter_info, fill_weekday, month_days, weekday_type, year_quarter_type
+
+
+def plot_year_month(month_year_groupby):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(18,6))
+    _ = sns.barplot(x='month-year', y='duration_hours', ax = ax, hue='year', data=month_year_groupby, dodge=False)
+
+    change_width(_, .87)
+
+    plt.xticks(rotation='vertical')
+    plt.ylabel('Watched hours')
+    plt.title('Distribution of watched hours across months')
+    plt.xlabel('')
+    
+    return fig
+
+
+def plot_year_quarter(quarter_year_groupby):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(18,6))
+    _ = sns.barplot(x='quarter-year', y='duration_hours', ax = ax, hue='year', data=quarter_year_groupby, dodge=False)
+
+    change_width(_, .87)
+
+    plt.xticks(rotation='vertical')
+    plt.ylabel('Watched hours')
+    plt.title('Distribution of watched hours across quarters of the year')
+    plt.xlabel('')
+    
+    return fig
+
+
+def distribution_quarter_year(cube, quarter_year_groupby, first_day, last_day):
+    import matplotlib.pyplot as plt
+
+    quarter_year_type_groupby = year_quarter_type(cube).rename(columns={'quarter': 'quarter_id'})
+
+
+    quarter_year_TV_show = quarter_year_type_groupby[ quarter_year_type_groupby["is_TV_show"] == True]
+    quarter_year_film = quarter_year_type_groupby[ quarter_year_type_groupby["is_TV_show"] == False]
+
+    quarter_year_TV_show = fill_quarter_info (quarter_year_TV_show[['year','quarter_id','duration','duration_hours']], first_day, last_day)
+    quarter_year_film  = fill_quarter_info (quarter_year_film[['year','quarter_id','duration','duration_hours']], first_day, last_day)
+
+    quarter_year_groupby = quarter_year_groupby.set_index('quarter-year')
+
+    fig, ax = plt.subplots(figsize=(6,4))
+    ax.plot(quarter_year_groupby.index, quarter_year_groupby["duration_hours"], label='Total')
+    ax.plot(quarter_year_groupby.index, quarter_year_TV_show["duration_hours"], label='TV shows')
+    ax.plot(quarter_year_groupby.index, quarter_year_film["duration_hours"], label='Films')
+
+    plt.legend()
+    plt.xticks(quarter_year_groupby.index, rotation='vertical')
+    plt.ylabel('Watched hours')
+    #plt.xlabel('Year')
+    plt.title('Distribution between TV shows and films during the years')
+
+    return fig
+
+
+def plot_most_watched (most_watched):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(1,1, figsize=(12,4))
+    plt.barh(most_watched.index, most_watched['duration_hours'])
+    plt.xlabel('Watched hours')
+
+    return fig
+
+
+def plot_overall_distribution(cube):
+    import matplotlib.pyplot as plt
+
+    TV_show_vs_films = content_type(cube).set_index("is_TV_show")
+    TV_show_vs_films = TV_show_vs_films["duration"]
+    TV_show_vs_films = TV_show_vs_films.sort_values(ascending=False)
+    size_TV_show_vs_films = TV_show_vs_films / TV_show_vs_films.sum()
+
+    labels = ["TV shows", "Films & Documentaries"]
+
+    fig, ax = plt.subplots(1,1, figsize=(8,4))
+
+    # Pie
+    ax.pie(size_TV_show_vs_films, labels=labels, autopct='%1.1f%%',
+            shadow=False, startangle=180)
+    ax.axis('equal')
+   
+    ax.set_title('Overall distribution')
+
+    return fig
+
+
+def plot_monthly_distribution (month_year_groupby, first_day, last_day):
+    import matplotlib.pyplot as plt
+
+    month_years_pt = month_year_groupby.pivot_table( values="duration_hours", index = "month_name",                                                                                     columns = "year", aggfunc = sum, fill_value = 0)
+    month_years_pt['acumulated'] = 0
+
+    month_years_pt = month_years_pt.loc[["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]]
+
+    first_year, last_year = first_day.year, last_day.year
+    years = np.arange(first_year, last_day.year + 1)
+
+    fig, ax = plt.subplots(figsize=(12,8))
+    
+    for year in years:
+        ax.plot( month_years_pt.index, month_years_pt[year], label= str(year), linewidth = 3)
+    
+    # Stacked
+    #for year in years:
+    #    ax.bar( month_years_pt.index, month_years_pt[year], label= str(year), bottom = month_years_pt['acumulated'])
+    #    month_years_pt['acumulated'] = month_years_pt['acumulated'] + month_years_pt[year]
+
+    ax.set_xticklabels( month_years_pt.index) 
+    ax.set_ylabel("Watched hours")
+    plt.title('Distribution of monthly watched hours during the years')
+    ax.legend()
+    
+    return fig
+
+
+def fill_weekdays(weekday_df):
+    return fill_weekday(weekday_df)
+
+
+def plot_weekday_distribution (cube):
+    import matplotlib.pyplot as plt
+
+    weekday_groupby = weekday_type(cube)
+
+    weekday_TV_shows = weekday_groupby[weekday_groupby["is_TV_show"] == True]
+    weekday_films = weekday_groupby[weekday_groupby["is_TV_show"] == False]
+    weekday_TV_shows = fill_weekdays(weekday_TV_shows[['weekday','duration']])
+    weekday_films = fill_weekdays(weekday_films[['weekday','duration']])
+
+    weekday_names =["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
+
+    fig, ax = plt.subplots(figsize=(8,4))
+
+    ax.bar( weekday_names, weekday_TV_shows["duration"], label="TV shows" )
+    ax.bar( weekday_names, weekday_films["duration"], bottom = weekday_TV_shows["duration"], label = "Films" )
+    ax.set_ylabel("Watched hours")
+    plt.title('Distribution of watched hours during the each day of the week')
+    ax.legend()
+
+    return fig
+
+
+def plot_day (cube, month_chosen, year_chosen):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    day_groupby = month_days(cube, year_chosen, month_chosen)
+    day_groupby = day_groupby[['day','duration_hours']].rename(columns={'duration_hours': 'duration'})
+    day_groupby = fill_month_day(day_groupby, year_chosen, month_chosen)
+
+    fig, ax = plt.subplots(figsize=(12,4))
+    _ = sns.barplot(x='day', y='duration', ax = ax, data=day_groupby, dodge=False)
+    change_width(_, .87)
+
+    plt.xticks(rotation='vertical')
+    plt.ylabel('Watched hours')
+    #plt.title('Distribution of watched hours each day in '+ MONTH_NAMES[month_chosen - 1] + ', ' + str(year_chosen))
+    plt.xlabel('')
+
+    return fig
+
+
+def change_width(ax, new_value) :
+    for patch in ax.patches :
+        current_width = patch.get_width()
+        diff = current_width - new_value
+        # we change the bar width
+        patch.set_width(new_value)
+        # we recenter the bar
+        patch.set_x(patch.get_x() + diff * .5)
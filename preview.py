@@ -0,0 +1,132 @@
+"""
+Fast preview of a large upload: the watched hours, monthly series and top
+TV shows estimated from a stratified sample of its rows, with 95% bounds,
+while the exact results are computed.
+
+The file is split in equal byte ranges and one line is taken at a random
+offset of each, so the sample is spread over the whole history (exports are
+sorted by date) and its cost does not depend on the size of the file. The
+totals are estimated as N times the sample mean, with the standard error of
+a simple random sample, which is conservative for a stratified one.
+"""
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from dates import calendar_fields
+from ingest import read_history_chunks
+
+
+PREVIEW_MIN_BYTES = 5 * 1024 ** 2
+SAMPLE_ROWS = 20000
+Z = 1.96
+
+NEWLINE = ord('\n')
+BLOCK = 16 * 1024 ** 2
+MAX_LINE = 4096
+
+
+def count_rows(data):
+    """
+    Rows of a CSV (without the header), counting its newlines block by block
+    :param data: uint8 array of the file
+    """
+    newlines = sum(int(np.count_nonzero(data[start:start + BLOCK] == NEWLINE)) for start in range(0, len(data), BLOCK))
+    if len(data) and data[-1] != NEWLINE:
+        newlines += 1
+
+    return max(newlines - 1, 0)
+
+
+def _next_line(data, offset):
+    """
+    Start of the first line after offset, or None
+    """
+    window = np.flatnonzero(data[offset:offset + MAX_LINE] == NEWLINE)
+    if len(window) == 0:
+        return None
+    start = offset + int(window[0]) + 1
+    return start if start < len(data) else None
+
+
+def sample_history(content, n_samples=SAMPLE_ROWS, seed=0):
+    """
+    Stratified sample of the rows of a viewing history CSV
+    :param content: bytes or buffer of the file
+    :return: raw Date/Title DataFrame of the sampled rows, number of rows of the file
+    """
+    data = np.frombuffer(content, dtype=np.uint8)
+    n_rows = count_rows(data)
+    header_end = _next_line(data, 0)
+    if header_end is None:
+        return pd.DataFrame(columns=['Date', 'Title']), n_rows
+
+    # One random offset in each of n_samples equal ranges of the body
+    bounds = np.linspace(header_end, len(data), min(n_samples, n_rows) + 1)
+    offsets = (bounds[:-1] + np.random.RandomState(seed).random_sample(len(bounds) - 1) * np.diff(bounds)).astype(np.int64)
+    starts = np.unique([start for start in (_next_line(data, offset - 1) for offset in offsets) if start is not None])
+
+    ends = [_next_line(data, start) or len(data) for start in starts]
+    lines = [data[:header_end].tobytes()] + [data[start:end].tobytes() for start, end in zip(starts, ends)]
+    sample = pd.concat(read_history_chunks(BytesIO(b''.join(lines).replace(b'\r', b''))),
+                       ignore_index=True) if len(starts) else pd.DataFrame(columns=['Date', 'Title'])
+
+    return sample, n_rows
+
+
+def _estimate(groups, values, n_rows):
+    """
+    Estimated total of values in every group of the population, from a
+    sample, with the half width of its 95% interval
+    :return: DataFrame indexed by group with estimate and bound
+    """
+    n_sample = len(values)
+    values = pd.Series(np.asarray(values, dtype=np.float64), index=groups)
+    sums = values.groupby(level=list(range(groups.nlevels))).agg(['sum', 'count'])
+    squares = (values ** 2).groupby(level=list(range(groups.nlevels))).sum()
+
+    # Each group total is N * mean(x * 1[group]) over the whole sample
+    mean = sums['sum'] / n_sample
+    variance = (squares - n_sample * mean ** 2) / max(n_sample - 1, 1)
+    correction = np.sqrt(max(1 - n_sample / n_rows, 0)) if n_rows else 0
+
+    return pd.DataFrame({'estimate': n_rows * mean,
+                         'bound': Z * n_rows * np.sqrt(variance.clip(lower=0) / n_sample) * correction,
+                         'sampled': sums['count']})
+
+
+def _with_bounds(estimates):
+    return pd.DataFrame({'hours': estimates['estimate'],
+                         'low': (estimates['estimate'] - estimates['bound']).clip(lower=0),
+                         'high': estimates['estimate'] + estimates['bound']}, index=estimates.index)
+
+
+def estimate_history(netflix_hist, n_rows, n=10):
+    """
+    Watched hours, monthly series and top TV shows of the whole history,
+    estimated from a prepared sample of it (see clean_and_prepare_data and
+    add_duration)
+    :return: dict with rows, sample, hours and hours_bound, months and top_shows DataFrames (hours, low, high)
+    """
+    n_sample = len(netflix_hist)
+    hours = netflix_hist['duration'].values / 60
+    if n_sample == 0:
+        raise ValueError("The file does not contain any viewing activity")
+
+    total = _estimate(pd.Index(np.zeros(n_sample, dtype=int)), hours, n_rows).iloc[0]
+
+    fields = calendar_fields(netflix_hist['day_number'].values)
+    months = _estimate(pd.MultiIndex.from_arrays([fields['year'], fields['month']], names=['year', 'month']),
+                       hours, n_rows).sort_index()
+
+    # Films are kept in the sample as a group of their own, which is dropped
+    TV_shows = netflix_hist['is_TV_show'].values
+    show_names = np.where(TV_shows, np.asarray(netflix_hist['TV_show'].values.astype(str)), '')
+    shows = _estimate(pd.Index(show_names, name='show'), hours, n_rows).drop('', errors='ignore')
+    episodes = shows['sampled'] * n_rows / n_sample
+    shows = shows.assign(episodes=episodes).nlargest(n, 'estimate')
+
+    return {'rows': n_rows, 'sample': n_sample, 'hours': total['estimate'], 'hours_bound': total['bound'],
+            'months': _with_bounds(months).reset_index(),
+            'top_shows': _with_bounds(shows).assign(episodes=shows['episodes'].round().astype(int))}
@@ -0,0 +1,166 @@
+import importlib
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from io import BytesIO
+
+
+FIGURE_MODULE = 'plotting'
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+_pool = None
+_pool_lock = threading.Lock()
+_main_lock = threading.Lock()
+
+
+def figure_to_png(fig):
+    import matplotlib.pyplot as plt
+
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def render_figure(function_name, args, module=FIGURE_MODULE):
+    """
+    Build a figure with the plot function of the given module and return it
+    as PNG bytes. The function is looked up by name in a module without
+    Streamlit calls, so that a task only names it and a worker only imports
+    matplotlib, seaborn and that module (see submit_all for the page itself).
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+    plot_function = getattr(importlib.import_module(module), function_name)
+    return figure_to_png(plot_function(*args))
+
+
+def render_figure_timed(function_name, args, module=FIGURE_MODULE):
+    start = time.perf_counter()
+    png = render_figure(function_name, args, module)
+    return png, time.perf_counter() - start
+
+
+def warm_worker(module=FIGURE_MODULE):
+    """
+    Import the plotting modules and the figure module in a worker, so the
+    first figure it renders does not pay for them
+    :return: seconds spent importing
+    """
+    start = time.perf_counter()
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot
+    import seaborn
+
+    importlib.import_module(module)
+    return time.perf_counter() - start
+
+
+def warm_pool(max_workers=MAX_WORKERS):
+    """
+    Start the workers of the pool and warm each of them up
+    :return: seconds until they are all ready
+    """
+    if max_workers <= 1:
+        return 0.0
+
+    start = time.perf_counter()
+    for future in submit_all(get_pool(max_workers), warm_worker, [()] * max_workers):
+        future.result()
+    return time.perf_counter() - start
+
+
+def get_pool(max_workers=MAX_WORKERS):
+    """
+    Process pool shared by every session and kept across reruns. Workers are
+    spawned rather than forked, as the Streamlit server runs several threads.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+@contextmanager
+def _main_without_file():
+    """
+    Hide the __main__ module from the processes spawned meanwhile
+    """
+    with _main_lock:
+        main = sys.modules.get('__main__')
+        if getattr(main, '__file__', None) is None:
+            yield
+            return
+
+        bare = types.ModuleType('__main__')
+        sys.modules['__main__'] = bare
+        try:
+            yield
+        finally:
+            # Unless Streamlit started another run of the page meanwhile
+            if sys.modules.get('__main__') is bare:
+                sys.modules['__main__'] = main
+
+
+def submit_all(pool, function, args_list):
+    """
+    Submit function(*args) for every args to the pool. Workers are spawned
+    when tasks are submitted and a spawned process imports the file of
+    __main__ again, as __mp_main__: under Streamlit that file is the page,
+    which would load Streamlit and draw the page in every worker. It is
+    hidden while submitting, so workers only import the modules of the
+    functions they run.
+    :return: list of futures
+    """
+    with _main_without_file():
+        return [pool.submit(function, *args) for args in args_list]
+
+
+def run_in_pool(function, tasks, max_workers=MAX_WORKERS):
+    """
+    Call function(*args) for every task in the shared pool, or in this
+    process when there is a single task or worker, or after a worker died
+    :param tasks: list of (key, args)
+    :return: iterator of (key, result), in completion order
+    """
+    global _pool
+    if max_workers <= 1 or len(tasks) <= 1:
+        for key, args in tasks:
+            yield key, function(*args)
+        return
+
+    done = set()
+    try:
+        submitted = submit_all(get_pool(max_workers), function, [args for _, args in tasks])
+        futures = {future: key for future, (key, _) in zip(submitted, tasks)}
+        for future in as_completed(futures):
+            key, result = futures[future], future.result()
+            done.add(key)
+            yield key, result
+    except BrokenProcessPool:
+        # A worker died: drop the pool and finish the remaining tasks here
+        with _pool_lock:
+            _pool = None
+        for key, args in tasks:
+            if key not in done:
+                yield key, function(*args)
+
+
+def render_figures(tasks, max_workers=MAX_WORKERS):
+    """
+    Render figures in parallel and yield them as soon as each one is ready
+    :param tasks: list of (name, function name, args)
+    :return: iterator of (name, PNG bytes, seconds spent rendering), in completion order
+    """
+    tasks = [(name, (function_name, args)) for name, function_name, args in tasks]
+    for name, (png, elapsed) in run_in_pool(render_figure_timed, tasks, max_workers):
+        yield name, png, elapsed
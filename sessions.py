@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from dates import from_day_number
+
+
+# Episodes of the same show in one day that make a binge
+BINGE_EPISODES = 3
+
+SITTING_COLUMNS = ['show', 'day_number', 'episodes']
+STREAK_COLUMNS = ['show', 'first_day', 'last_day', 'days', 'episodes']
+REPORT_COLUMNS = ['episodes', 'sittings', 'episodes_per_sitting', 'binges', 'biggest_binge', 'biggest_binge_day',
+                  'longest_streak', 'streak_first_day', 'streak_last_day', 'streak_episodes']
+
+
+def _run_starts(key):
+    """
+    Positions where a sorted array changes value
+    """
+    starts = np.ones(len(key), dtype=bool)
+    starts[1:] = key[1:] != key[:-1]
+
+    return np.flatnonzero(starts)
+
+
+def sittings(netflix_hist):
+    """
+    TV show episodes grouped by show and day, the finest session the export
+    allows as it only has the date of every title. The episodes are counted
+    per (show, day) with a hash aggregation and only these sittings are
+    sorted, by show and then day.
+    :return: DataFrame with the show (categorical), day_number and episodes of every sitting
+    """
+    is_TV_show = np.asarray(netflix_hist['is_TV_show'], dtype=bool)
+    shows = netflix_hist['TV_show'].values
+    keys = pd.DataFrame({'show': shows.codes[is_TV_show],
+                         'day_number': np.asarray(netflix_hist['day_number'])[is_TV_show]})
+
+    counts = keys.groupby(['show', 'day_number'], sort=False).size()
+    show_codes = counts.index.get_level_values('show').values
+    day_numbers = counts.index.get_level_values('day_number').values
+    order = np.lexsort((day_numbers, show_codes))
+
+    return pd.DataFrame({'show': pd.Categorical.from_codes(show_codes[order], categories=shows.categories),
+                         'day_number': day_numbers[order].astype(np.int32),
+                         'episodes': counts.values[order].astype(np.int32)},
+                        columns=SITTING_COLUMNS)
+
+
+def streaks(sittings_):
+    """
+    Runs of consecutive days watching the same show, found with a shift/diff
+    over the sorted sittings
+    :return: DataFrame with the show, first and last day number, days and episodes of every streak
+    """
+    show_codes = sittings_['show'].values.codes
+    day_numbers = sittings_['day_number'].values
+    if len(sittings_) == 0:
+        return pd.DataFrame(columns=STREAK_COLUMNS)
+
+    # A streak breaks when the show changes or a day is skipped
+    gap = np.ones(len(day_numbers), dtype=bool)
+    gap[1:] = (show_codes[1:] != show_codes[:-1]) | (np.diff(day_numbers) != 1)
+    starts = np.flatnonzero(gap)
+    ends = np.append(starts[1:], len(day_numbers)) - 1
+
+    return pd.DataFrame({'show': pd.Categorical.from_codes(show_codes[starts], categories=sittings_['show'].cat.categories),
+                         'first_day': day_numbers[starts],
+                         'last_day': day_numbers[ends],
+                         'days': (ends - starts + 1).astype(np.int32),
+                         'episodes': np.add.reduceat(sittings_['episodes'].values, starts)},
+                        columns=STREAK_COLUMNS)
+
+
+def binge_report(netflix_hist, binge_episodes=BINGE_EPISODES):
+    """
+    Per show: days watched, episodes per sitting, number of binges (sittings
+    of at least binge_episodes episodes), biggest binge and longest streak
+    of consecutive days
+    :return: DataFrame indexed by show, sorted by episodes
+    """
+    sittings_ = sittings(netflix_hist)
+    streaks_ = streaks(sittings_)
+
+    show_codes = sittings_['show'].values.codes
+    episodes = sittings_['episodes'].values
+    starts = _run_starts(show_codes)
+    if len(starts) == 0:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+
+    report = pd.DataFrame({'episodes': np.add.reduceat(episodes, starts),
+                           'sittings': np.diff(np.append(starts, len(episodes))),
+                           'binges': np.add.reduceat((episodes >= binge_episodes).astype(np.int32), starts),
+                           'biggest_binge': np.maximum.reduceat(episodes, starts)},
+                          index=pd.Index(sittings_['show'].cat.categories[show_codes[starts]], name='show'))
+    report['episodes_per_sitting'] = report['episodes'] / report['sittings']
+
+    # Day of the biggest binge: first sitting of each show reaching its maximum
+    biggest = episodes == np.repeat(report['biggest_binge'].values, report['sittings'].values)
+    first_biggest = _run_starts(show_codes[biggest])
+    report['biggest_binge_day'] = from_day_number(sittings_['day_number'].values[biggest][first_biggest])
+
+    # Longest streak of every show, the earliest one on ties
+    streak_codes = streaks_['show'].values.codes
+    order = np.lexsort((-streaks_['days'].values, streak_codes))
+    longest = streaks_.iloc[order[_run_starts(streak_codes[order])]]
+    report['longest_streak'] = longest['days'].values
+    report['streak_first_day'] = from_day_number(longest['first_day'].values)
+    report['streak_last_day'] = from_day_number(longest['last_day'].values)
+    report['streak_episodes'] = longest['episodes'].values
+
+    return report[REPORT_COLUMNS].sort_values('episodes', ascending=False, kind='mergesort')
@@ -0,0 +1,96 @@
+import pandas as pd
+
+from dates import calendar_fields
+
+
+SHOW_INDEX_COLUMNS = ['Title', 'show', 'season', 'episode', 'year', 'count', 'duration']
+
+
+def split_titles(titles):
+    """
+    Split distinct titles "Show: Season: Episode" into their parts. The show
+    is everything before the first colon, as in the TV_show column; titles
+    with a single colon have no season.
+    :return: DataFrame with show, season and episode columns
+    """
+    parts = pd.Series(titles).astype(str).str.split(':', n=2, expand=True).reindex(columns=range(3))
+    has_season = parts[2].notnull()
+
+    return pd.DataFrame({'show': parts[0],
+                         'season': parts[1].where(has_season, '').fillna('').str.strip(),
+                         'episode': parts[2].where(has_season, parts[1]).fillna('').str.strip()})
+
+
+def build_show_index(netflix_hist, keys=()):
+    """
+    Index the TV show episodes of the history once: one row per (title, year)
+    with its show, season and episode names, how many times it was watched
+    and for how long. Rankings are computed from this index
+    without going back to the history.
+    :param keys: extra columns of the history to index by, e.g. ('profile',)
+    :return: DataFrame with keys and SHOW_INDEX_COLUMNS
+    """
+    keys = list(keys)
+    TV_shows = netflix_hist[netflix_hist['is_TV_show'].values]
+    titles = TV_shows.index
+    if not isinstance(titles, pd.CategoricalIndex):
+        titles = pd.CategoricalIndex(titles)
+
+    stats = pd.DataFrame(dict({key: TV_shows[key].values for key in keys},
+                              title=titles.codes,
+                              year=calendar_fields(TV_shows['day_number'].values)['year'],
+                              duration=TV_shows['duration'].values))
+    stats = stats.groupby(keys + ['title', 'year'], observed=True)['duration'].agg(['sum', 'count']).reset_index()
+
+    # Title parts are computed per distinct title and broadcast by code
+    parts = split_titles(titles.categories)
+    codes = stats['title'].values
+    show_index = pd.DataFrame(dict({key: stats[key].values for key in keys},
+                                   Title=titles.categories.values[codes],
+                                   show=parts['show'].values[codes],
+                                   season=parts['season'].values[codes],
+                                   episode=parts['episode'].values[codes],
+                                   year=stats['year'].values,
+                                   count=stats['count'].values,
+                                   duration=stats['sum'].values))
+
+    return show_index
+
+
+def merge_show_indexes(show_indexes):
+    if len(show_indexes) == 1:
+        return show_indexes[0]
+
+    show_index = pd.concat(show_indexes, ignore_index=True)
+    return show_index.groupby(['Title', 'show', 'season', 'episode', 'year'], as_index=False)[['count', 'duration']].sum()
+
+
+def show_totals(show_index):
+    totals = show_index.groupby('show')[['duration', 'count']].sum()
+    return totals.rename(columns={'duration': 'sum'})[['sum', 'count']]
+
+
+def top_shows(show_index, n=10):
+    """
+    The n most watched shows, picked with a partial selection instead of
+    sorting every show
+    :return: DataFrame indexed by show with sum, count and duration_hours
+    """
+    most_watched = show_totals(show_index).nlargest(n, 'sum')
+    most_watched['duration_hours'] = most_watched['sum'] / 60
+
+    return most_watched
+
+
+def top_shows_by(show_index, key, n=10):
+    """
+    The n most watched shows of every value of key (e.g. of every profile)
+    :return: DataFrame indexed by (key, show) with sum, count and duration_hours
+    """
+    totals = show_index.groupby([key, 'show'], observed=True)[['duration', 'count']].sum().reset_index()
+    totals = totals.rename(columns={'duration': 'sum'}).sort_values([key, 'sum'], ascending=[True, False])
+    most_watched = totals.groupby(key, observed=True).head(n).set_index([key, 'show'])[['sum', 'count']]
+    most_watched['duration_hours'] = most_watched['sum'] / 60
+
+    return most_watched
+
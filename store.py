@@ -0,0 +1,271 @@
+import hashlib
+import os
+import secrets
+import sqlite3
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from aggregation import CUBE_KEYS, build_cube, merge_cubes
+from durations import load_catalog
+from dates import detect_date_format, from_day_number, parse_dates, to_day_number
+from history import make_history
+from ingest import CHUNKSIZE, read_history_chunks
+from pipeline import add_duration, clean_and_prepare_data
+from shows import SHOW_INDEX_COLUMNS, build_show_index, merge_show_indexes
+
+
+PROFILE_DIR = 'profiles'
+# Profiles are found by a secret passphrase, of which only a salted slow hash names the file
+PROFILE_SALT = os.environ.get('NETFLIX_PROFILE_SALT', 'netflix-analysis-profiles').encode('utf-8')
+HASH_ITERATIONS = 100000
+MIN_PASSPHRASE_LENGTH = 12
+# Seconds an update waits for another session updating the same profile
+LOCK_TIMEOUT = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (day_number INTEGER, title TEXT, is_TV_show INTEGER, duration REAL);
+CREATE INDEX IF NOT EXISTS history_key ON history (day_number, title);
+CREATE TABLE IF NOT EXISTS cube (year INTEGER, quarter INTEGER, month INTEGER, day INTEGER, weekday INTEGER,
+                                 is_TV_show INTEGER, duration REAL, count INTEGER);
+CREATE TABLE IF NOT EXISTS show_index (Title TEXT, show TEXT, season TEXT, episode TEXT, year INTEGER, count INTEGER,
+                                       duration REAL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def new_passphrase():
+    return secrets.token_urlsafe(18)
+
+
+def profile_path(passphrase, directory=PROFILE_DIR):
+    """
+    File of the profile of a passphrase, named by a salted PBKDF2 hash of it
+    so that the files do not reveal nor let anyone guess the passphrases
+    """
+    if len(passphrase) < MIN_PASSPHRASE_LENGTH:
+        raise ValueError("A profile passphrase has at least {} characters".format(MIN_PASSPHRASE_LENGTH))
+    digest = hashlib.pbkdf2_hmac('sha256', passphrase.encode('utf-8'), PROFILE_SALT, HASH_ITERATIONS)
+    return os.path.join(directory, digest.hex() + '.sqlite')
+
+
+class ProfileStore(object):
+    """
+    Cleaned viewing history of a profile and its aggregates (cube and show
+    index) kept in a SQLite file. A new export of the same profile is diffed
+    against the stored rows by (Date, Title) and only the rows that were not
+    there before are classified and folded into the stored aggregates.
+    Updates hold the write lock of the file from the diff to the write, so
+    two sessions updating the same profile do not both add the same rows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Connection in a transaction that takes the write lock before its
+        first read. Rows are written with executemany, as pandas' to_sql
+        would commit in the middle of it.
+        """
+        connection = sqlite3.connect(self.path, timeout=LOCK_TIMEOUT, isolation_level=None)
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+
+    def _meta(self, connection):
+        return dict(connection.execute('SELECT key, value FROM meta').fetchall())
+
+    def _set_meta(self, connection, **values):
+        connection.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                               [(key, str(value)) for key, value in values.items()])
+
+    def revision(self):
+        """
+        Number of writes to the profile, which changes whenever an update or
+        a rebuild changes the stored history
+        """
+        with self._connect() as connection:
+            return int(self._meta(connection).get('revision', 0))
+
+    def _table(self, connection, name, columns):
+        return pd.read_sql('SELECT {} FROM {}'.format(', '.join(columns), name), connection)
+
+    def _replace(self, connection, name, table):
+        connection.execute('DELETE FROM {}'.format(name))
+        self._append(connection, name, table)
+
+    def _append(self, connection, name, table):
+        columns = list(table.columns)
+        connection.executemany('INSERT INTO {} ({}) VALUES ({})'.format(name, ', '.join(columns), ', '.join('?' * len(columns))),
+                               zip(*[table[column].tolist() for column in columns]))
+
+    def load(self):
+        """
+        Stored aggregates of the profile
+        :return: dict with cube, show_index, first_day and last_day, or None when the profile is empty
+        """
+        with self._connect() as connection:
+            return self._load(connection)
+
+    def _load(self, connection):
+        meta = self._meta(connection)
+        if 'first_day' not in meta:
+            return None
+
+        cube = self._table(connection, 'cube', CUBE_KEYS + ['duration', 'count'])
+        # SQLite stores booleans as 0/1
+        cube['is_TV_show'] = cube['is_TV_show'].astype(bool)
+        # An empty table is read back with object columns
+        show_index = self._table(connection, 'show_index', SHOW_INDEX_COLUMNS).astype({'year': int, 'count': int,
+                                                                                       'duration': float})
+        return {'cube': cube,
+                'show_index': show_index,
+                'first_day': from_day_number([int(meta['first_day'])])[0],
+                'last_day': from_day_number([int(meta['last_day'])])[0]}
+
+    def load_history(self):
+        """
+        The stored history in the compact layout of clean_and_prepare_data,
+        with its duration column
+        """
+        with self._connect() as connection:
+            return self._load_history(connection)
+
+    def _load_history(self, connection):
+        stored = pd.read_sql('SELECT day_number, title, is_TV_show, duration FROM history', connection)
+
+        netflix_hist = make_history(stored['day_number'].values, pd.Categorical(stored['title'].values),
+                                    stored['is_TV_show'].values.astype(bool))
+        netflix_hist['duration'] = stored['duration'].values.astype(np.float32)
+        return netflix_hist
+
+    def _stored_counts(self, connection):
+        counts = pd.read_sql('SELECT day_number, title AS Title, COUNT(*) AS n FROM history GROUP BY day_number, title',
+                             connection)
+        return counts.set_index(['day_number', 'Title'])['n']
+
+    def new_rows(self, source, chunksize=CHUNKSIZE):
+        """
+        Rows of an export that are not in the store yet. A (Date, Title) pair
+        that appears n times in the export and m times in the store gives
+        its last n - m occurrences.
+        :return: raw Date/Title DataFrame of the new rows, date format
+        """
+        with self._connect() as connection:
+            return self._new_rows(connection, source, chunksize)
+
+    def _new_rows(self, connection, source, chunksize=CHUNKSIZE):
+        stored = self._stored_counts(connection)
+
+        # Occurrences of every pair in the previous chunks of the export
+        seen = None
+        new, date_format = [], None
+        for chunk in read_history_chunks(source, chunksize):
+            if date_format is None:
+                date_format = detect_date_format(chunk['Date'])
+            keys = pd.DataFrame({'day_number': to_day_number(parse_dates(chunk['Date'].values, date_format)),
+                                 'Title': chunk['Title'].values})
+            index = pd.MultiIndex.from_frame(keys)
+
+            occurrence = keys.groupby(['day_number', 'Title']).cumcount().values
+            if seen is not None:
+                occurrence = occurrence + seen.reindex(index, fill_value=0).values
+            is_new = occurrence >= stored.reindex(index, fill_value=0).values
+
+            counts = keys.groupby(['day_number', 'Title']).size()
+            seen = counts if seen is None else seen.add(counts, fill_value=0)
+            if is_new.any():
+                new.append(chunk[is_new])
+
+        if not new:
+            return pd.DataFrame(columns=['Date', 'Title']), date_format
+        return pd.concat(new), date_format
+
+    def _write(self, connection, netflix_hist, cube, show_index, first_day, last_day, **meta):
+        """
+        Append netflix_hist to the stored history and replace the aggregates
+        """
+        self._append(connection, 'history', pd.DataFrame({'day_number': netflix_hist['day_number'].values,
+                                                          'title': np.asarray(netflix_hist.index.astype(str)),
+                                                          'is_TV_show': netflix_hist['is_TV_show'].values.astype(int),
+                                                          'duration': netflix_hist['duration'].values}))
+        self._replace(connection, 'cube', cube[CUBE_KEYS + ['duration', 'count']].astype({'is_TV_show': int}))
+        self._replace(connection, 'show_index', show_index[SHOW_INDEX_COLUMNS])
+        revision = int(self._meta(connection).get('revision', 0)) + 1
+        self._set_meta(connection, first_day=to_day_number([first_day])[0], last_day=to_day_number([last_day])[0],
+                       revision=revision, **meta)
+
+    def rebuild(self, TV_show_duration, film_duration):
+        """
+        Recompute durations and aggregates of the whole stored history, when
+        the durations or the title catalog used for the profile change
+        """
+        with self._transaction() as connection:
+            self._rebuild(connection, TV_show_duration, film_duration, load_catalog())
+
+    def _rebuild(self, connection, TV_show_duration, film_duration, catalog):
+        netflix_hist = add_duration(self._load_history(connection), TV_show_duration, film_duration, catalog)
+        stored = self._load(connection)
+        connection.execute('DELETE FROM history')
+        self._write(connection, netflix_hist, build_cube(netflix_hist), build_show_index(netflix_hist),
+                    stored['first_day'], stored['last_day'],
+                    TV_show_duration=float(TV_show_duration), film_duration=float(film_duration),
+                    catalog=catalog.key)
+
+    def update(self, source, TV_show_duration, film_duration, chunksize=CHUNKSIZE):
+        """
+        Fold the new rows of an export into the stored profile, running
+        clean_and_prepare_data and add_duration on those rows only
+        :return: dict of the updated aggregates (see load), number of new rows
+        """
+        catalog = load_catalog()
+        with self._transaction() as connection:
+            meta = self._meta(connection)
+            durations = (str(float(TV_show_duration)), str(float(film_duration)), catalog.key)
+            if 'first_day' in meta and (meta.get('TV_show_duration'), meta.get('film_duration'), meta.get('catalog', '')) != durations:
+                self._rebuild(connection, float(TV_show_duration), float(film_duration), catalog)
+
+            new_data, date_format = self._new_rows(connection, source, chunksize)
+            if len(new_data) == 0:
+                return self._load(connection), 0
+
+            netflix_hist, first_day, last_day = clean_and_prepare_data(new_data, date_format)
+            netflix_hist = add_duration(netflix_hist, TV_show_duration, film_duration, catalog)
+
+            stored = self._load(connection)
+            cube, show_index = build_cube(netflix_hist), build_show_index(netflix_hist)
+            if stored is not None:
+                cube = merge_cubes([stored['cube'], cube])
+                show_index = merge_show_indexes([stored['show_index'], show_index])
+                first_day, last_day = min(first_day, stored['first_day']), max(last_day, stored['last_day'])
+
+            self._write(connection, netflix_hist, cube, show_index, first_day, last_day,
+                        TV_show_duration=float(TV_show_duration), film_duration=float(film_duration),
+                        catalog=catalog.key)
+
+        return {'cube': cube, 'show_index': show_index, 'first_day': first_day, 'last_day': last_day}, len(new_data)
+
@@ -0,0 +1,78 @@
+"""
+Synthetic Netflix viewing histories for benchmarks.
+
+    python synthetic.py 1000000 synthetic_history.csv
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+SHOW_WORDS = ['La casa', 'Dark', 'Narcos', 'Élite', 'The Crown', 'Ozark', 'Merlí', 'Vikingos', 'Suits', 'Arrow',
+              'Stranger', 'Mindhunter', 'Las chicas', 'Money', 'Black', 'Sherlock', 'Fauda', 'Lupin', 'Sintonía', 'Bron']
+FILM_WORDS = ['Roma', 'The Irishman', 'Okja', 'Mudbound', 'Klaus', 'El hoyo', 'Mank', 'Enola', 'Contratiempo',
+              'Durante la tormenta', 'Spider-Man', 'Bird Box', 'Extraction', 'Marriage Story']
+
+# Title layouts seen in Spanish and English exports, with their share of shows
+SHOW_FORMATS = [('{show}: Temporada {season}: Capítulo {episode}', 0.35),
+                ('{show}: Temporada {season}: Episodio {episode}', 0.15),
+                ('{show}: Season {season}: Episode {episode}', 0.3),
+                ('{show}: Parte {season}: Capítulo {episode}', 0.1),
+                ('{show}: Miniserie: Capítulo {episode}', 0.1)]
+FILM_SHARE = 0.15
+
+
+def title_pool(n_titles, rng):
+    """
+    Distinct titles: episodes of several shows in the layouts of SHOW_FORMATS
+    plus films (some of them with a subtitle after a colon)
+    """
+    n_films = max(1, int(n_titles * FILM_SHARE))
+    n_shows = max(1, (n_titles - n_films) // 60)
+
+    formats = [f for f, _ in SHOW_FORMATS]
+    weights = np.array([w for _, w in SHOW_FORMATS])
+    titles = []
+    for i in range(n_shows):
+        show = '{} {}'.format(SHOW_WORDS[i % len(SHOW_WORDS)], i) if i >= len(SHOW_WORDS) else SHOW_WORDS[i]
+        title_format = formats[rng.choice(len(formats), p=weights / weights.sum())]
+        for season in range(1, rng.randint(2, 7)):
+            for episode in range(1, rng.randint(6, 14)):
+                titles.append(title_format.format(show=show, season=season, episode=episode))
+
+    for i in range(n_films):
+        film = '{} {}'.format(FILM_WORDS[i % len(FILM_WORDS)], i)
+        titles.append(film + ': La película' if i % 7 == 0 else film)
+
+    return np.array(titles, dtype=object)
+
+
+def generate_history(n_rows, start='2015-01-01', end='2021-12-31', seed=0):
+    """
+    Viewing history with the Date (d/m/yy) and Title columns of a Netflix
+    export, most recent first. Popular titles are watched far more often than
+    the rest (Zipf distribution) and the number of distinct titles grows with
+    the number of rows.
+    :return: DataFrame with Date and Title string columns
+    """
+    rng = np.random.RandomState(seed)
+    titles = title_pool(int(min(200000, max(500, 20 * np.sqrt(n_rows)))), rng)
+    rng.shuffle(titles)
+
+    ranks = rng.zipf(1.3, n_rows) - 1
+    title_codes = np.where(ranks < len(titles), ranks, rng.randint(0, len(titles), n_rows))
+
+    days = pd.date_range(start, end, freq='D')
+    date_strings = np.array(['{}/{}/{:02d}'.format(d.day, d.month, d.year % 100) for d in days], dtype=object)
+    day_codes = np.sort(rng.randint(0, len(days), n_rows))[::-1]
+
+    return pd.DataFrame({'Date': date_strings[day_codes], 'Title': titles[title_codes]})
+
+
+def write_history(path, n_rows, seed=0):
+    generate_history(n_rows, seed=seed).to_csv(path, index=False)
+
+
+if __name__ == "__main__":
+    write_history(sys.argv[2] if len(sys.argv) > 2 else 'synthetic_history.csv', int(sys.argv[1]))
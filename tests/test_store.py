@@ -0,0 +1,64 @@
+from io import BytesIO
+
+import pytest
+
+from store import ProfileStore
+
+
+def export(*rows):
+    return BytesIO(('Date,Title\n' + ''.join('{},{}\n'.format(date, title) for date, title in rows)).encode('utf-8'))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProfileStore(str(tmp_path / 'profile.sqlite'))
+
+
+def stored_pairs(store, *rows):
+    store.update(export(*rows), 40, 100)
+
+
+@pytest.mark.parametrize('chunksize', [1, 2, 3, 1000])
+def test_new_rows_counts_duplicate_pairs(store, chunksize):
+    stored_pairs(store, ('14/11/20', 'Dark: Season 1: "Secrets"'), ('14/11/20', 'Dark: Season 1: "Secrets"'),
+                 ('13/11/20', 'Roma'))
+
+    # Three times the pair stored twice, once the one stored once, twice a new one
+    new, _ = store.new_rows(export(('14/11/20', 'Dark: Season 1: "Secrets"'), ('13/11/20', 'Roma'),
+                                   ('14/11/20', 'Dark: Season 1: "Secrets"'), ('12/11/20', 'Okja'),
+                                   ('14/11/20', 'Dark: Season 1: "Secrets"'), ('12/11/20', 'Okja')),
+                            chunksize=chunksize)
+
+    assert sorted(zip(new['Date'], new['Title'])) == [('12/11/20', 'Okja'), ('12/11/20', 'Okja'),
+                                                      ('14/11/20', 'Dark: Season 1: "Secrets"')]
+
+
+@pytest.mark.parametrize('chunksize', [1, 2, 1000])
+def test_new_rows_keeps_last_occurrences_across_chunks(store, chunksize):
+    stored_pairs(store, ('14/11/20', 'Roma'))
+
+    new, _ = store.new_rows(export(('14/11/20', 'Roma'), ('13/11/20', 'Okja'), ('14/11/20', 'Roma')),
+                            chunksize=chunksize)
+
+    assert list(new.index) == [1, 2]
+
+
+def test_new_rows_of_a_stored_export_is_empty(store):
+    rows = [('14/11/20', 'Roma'), ('14/11/20', 'Roma'), ('13/11/20', 'Okja')]
+    stored_pairs(store, *rows)
+
+    new, _ = store.new_rows(export(*rows), chunksize=2)
+
+    assert len(new) == 0
+
+
+def test_update_adds_only_new_rows_and_bumps_revision(store):
+    store.update(export(('14/11/20', 'Roma'), ('14/11/20', 'Roma')), 40, 100)
+    revision = store.revision()
+
+    _, added = store.update(export(('14/11/20', 'Roma'), ('14/11/20', 'Roma'), ('14/11/20', 'Roma')), 40, 100,
+                            chunksize=2)
+
+    assert added == 1
+    assert len(store.load_history()) == 3
+    assert store.revision() == revision + 1
@@ -0,0 +1,121 @@
+"""
+Warm-up of the plotting stack, so that the first request after a dyno boots
+does not wait for it.
+
+    python warmup.py [--json]
+
+imports the app's dependencies, builds the matplotlib font cache and draws a
+figure with the Agg backend, logging the seconds of every step as JSON lines
+(or printing them as one JSON list with --json). It runs in the Procfile
+before the server starts, which leaves the font cache on disk. On its first
+run in a process the app calls start(), which does the same in a background
+thread. The figure rendering workers are only started, by start_pool(), once
+static images are chosen: interactive charts are drawn by the browser.
+"""
+import argparse
+import importlib
+import json
+import sys
+import threading
+from io import BytesIO
+
+from instrument import Recorder, configure_logging, logger, stage
+
+
+APP_MODULES = ['numpy', 'pandas', 'altair', 'streamlit']
+PLOTTING_MODULES = ['matplotlib', 'matplotlib.font_manager', 'matplotlib.pyplot', 'seaborn']
+
+_threads = {}
+_threads_lock = threading.Lock()
+
+
+def timed_imports(recorder, modules):
+    for name in modules:
+        with stage(recorder, 'import ' + name):
+            importlib.import_module(name)
+            if name == 'matplotlib':
+                sys.modules['matplotlib'].use('Agg')
+
+
+def warm_plotting(recorder=None):
+    """
+    Import the plotting modules (matplotlib.font_manager loads the font
+    cache, or builds it when there is none) and draw a figure with text
+    """
+    timed_imports(recorder, PLOTTING_MODULES)
+
+    # The object oriented API, as pyplot is not thread safe
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    with stage(recorder, 'first figure'):
+        fig = Figure(figsize=(2, 1))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
+        ax.bar(['TV shows', 'Films'], [1, 2])
+        ax.set_title('Watched hours')
+        fig.savefig(BytesIO(), format='png')
+
+
+def _warm_pool(recorder):
+    from render import warm_pool
+
+    recorder.add('render workers', warm_pool())
+
+
+def _warm_up(name, warm):
+    recorder = Recorder(run_id=name)
+    try:
+        warm(recorder)
+    except Exception:
+        # The page works without the warm-up, only slower
+        logger.exception('%s failed', name)
+    recorder.emit()
+
+
+def _in_background(name, warm):
+    """
+    Run a warm-up in a background thread, once per process
+    """
+    with _threads_lock:
+        if name not in _threads:
+            _threads[name] = threading.Thread(target=_warm_up, args=(name, warm), name=name, daemon=True)
+            _threads[name].start()
+        return _threads[name]
+
+
+def start():
+    """
+    Warm up the plotting stack of this process in the background
+    """
+    return _in_background('warmup', warm_plotting)
+
+
+def start_pool():
+    """
+    Start and warm up the figure rendering workers in the background
+    """
+    return _in_background('warmup pool', _warm_pool)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm up the plotting stack of the Netflix viewing history app")
+    parser.add_argument('--json', action='store_true', help="print the timings as one JSON list")
+    args = parser.parse_args(argv)
+
+    recorder = Recorder(run_id='startup')
+    with stage(recorder, 'total'):
+        timed_imports(recorder, APP_MODULES)
+        warm_plotting(recorder)
+
+    if args.json:
+        print(json.dumps(recorder.records()))
+    else:
+        configure_logging()
+        recorder.emit()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())